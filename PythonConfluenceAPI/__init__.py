@@ -3,10 +3,80 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from future import standard_library
-standard_library.install_aliases()
-
 __author__ = 'Robert Cope, Pushrod Technology'
+__version__ = '0.0.1rc6'
+
+import importlib
+
+from .api import ConfluenceAPI, PageSizeTuner, all_of
+
+# Everything beyond the core synchronous API is imported on first use, so importing the package stays cheap (in
+# particular, requests-futures is only loaded once ConfluenceFuturesAPI is used).
+_LAZY_EXPORTS = {
+    "ConfluenceFuturesAPI": ".cfapi",
+    "ImmutableCache": ".cache",
+    "MemoryCache": ".cache",
+    "DiskCache": ".cache",
+    "LazyContent": ".lazy",
+    "lazy_content": ".lazy",
+    "Content": ".models",
+    "Space": ".models",
+    "Label": ".models",
+    "Attachment": ".models",
+    "Version": ".models",
+    "ModelFactory": ".models",
+    "model_callback": ".models",
+    "export_ndjson": ".export",
+    "export_parquet": ".export",
+    "export_arrow_ipc": ".export",
+    "RequestMetrics": ".metrics",
+    "endpoint_template": ".metrics",
+    "RequestMiddleware": ".middleware",
+    "ServiceRequest": ".middleware",
+    "RecordingMiddleware": ".recording",
+    "ReplayMiddleware": ".recording",
+    "CassetteMissError": ".recording",
+    "then": ".compose",
+    "gather": ".compose",
+    "map_futures": ".compose",
+    "as_completed": ".compose",
+    "sharded_search": ".parallel",
+    "shard_queries": ".parallel",
+    "crawl_spaces": ".parallel",
+    "bulk_delete": ".bulk",
+    "delete_subtree": ".bulk",
+    "DeleteResult": ".bulk",
+    "DeleteSkippedError": ".bulk",
+    "HedgePolicy": ".hedge",
+    "CircuitBreaker": ".breaker",
+    "CircuitOpenError": ".breaker",
+    "Deadline": ".deadline",
+    "DeadlineExceeded": ".deadline",
+    "current_deadline": ".deadline",
+    "ClientPool": ".pool",
+    "FairExecutor": ".pool",
+    "SessionCookieAuth": ".auth",
+    "iter_versions": ".history",
+    "version_diffs": ".history",
+    "diff_versions": ".history",
+    "VersionDiff": ".history",
+    "ContentIndex": ".index",
+    "PropertyStore": ".properties",
+    "audit_restrictions": ".audit",
+    "fetch_restrictions": ".audit",
+}
+
+__all__ = ["ConfluenceAPI", "PageSizeTuner", "all_of"] + sorted(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
-from .api import ConfluenceAPI, all_of
-from .cfapi import ConfluenceFuturesAPI
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
@@ -1,11 +1,12 @@
 from __future__ import absolute_import
-import future.standard_library
-future.standard_library.install_aliases()
 
 __author__ = "Robert Cope"
 
 import sys
+import threading
 import requests
+from timeit import default_timer
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from urllib.parse import urljoin
 
@@ -15,11 +16,71 @@ try:
 except ImportError:
     import json
 
+from .deadline import Deadline, DeadlineExceeded, current_deadline, within
+from .middleware import ServiceRequest, run_middleware
+from .models import ModelFactory
+from .utils import resolve
+
 api_logger = logging.getLogger(__name__)
 nh = logging.NullHandler()
 api_logger.addHandler(nh)
 
 
+class PageSizeTuner(object):
+    def __init__(self, target_latency=1.0, target_bytes=None, initial_limit=25, min_limit=1, max_limit=1000,
+                 max_step=2.0):
+        """
+        Adapts the page size (limit) used by all_of to the cost of the pages actually observed, aiming for a target
+        latency and/or response size per request. Bare listings grow towards large pages, while heavy expansions
+        (e.g. body.storage) shrink towards pages that fit the budget. When the server clamps the requested limit, the
+        clamped value becomes the upper bound.
+
+        Keep one tuner per end point and expand combination and reuse it across calls, so later crawls start from a
+        good page size.
+        :param target_latency: (Optional): The target latency per page request, in seconds. None to ignore latency.
+                               Default: 1.0.
+        :param target_bytes: (Optional): The target response size per page request, in bytes. None to ignore size.
+                             Default: None.
+        :param initial_limit: (Optional): The page size of the first request. Default: 25.
+        :param min_limit: (Optional): The smallest page size to request. Default: 1.
+        :param max_limit: (Optional): The largest page size to request. Default: 1000.
+        :param max_step: (Optional): The largest factor the page size may grow or shrink by between requests.
+                         Default: 2.0.
+        """
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_step = max_step
+
+    def observe(self, requested, returned_limit, size, latency, response_bytes=None):
+        """
+        Update the page size from an observed page request.
+        :param requested: The limit that was requested.
+        :param returned_limit: The limit echoed back by the server (None if absent).
+        :param size: The number of results returned.
+        :param latency: The request latency, in seconds.
+        :param response_bytes: (Optional): The response size in bytes, if known.
+        :return: The page size to request next.
+        """
+        if returned_limit is not None and returned_limit < requested:
+            api_logger.debug("Server clamped page size from {} to {}.".format(requested, returned_limit))
+            self.max_limit = max(self.min_limit, returned_limit)
+        ratios = []
+        if size:
+            if self.target_latency and latency:
+                ratios.append(self.target_latency / latency)
+            if self.target_bytes and response_bytes:
+                ratios.append(float(self.target_bytes) / response_bytes)
+        # Only a full page says anything about how much larger pages would cost.
+        if ratios and (size >= requested or min(ratios) < 1):
+            ratio = max(1.0 / self.max_step, min(self.max_step, min(ratios)))
+            self.limit = int(round(self.limit * ratio))
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+        return self.limit
+
+
 def all_of(api_call, *args, **kwargs):
     """
     Generator that iterates over all results of an API call that requires limit/start pagination.
@@ -27,6 +88,19 @@ def all_of(api_call, *args, **kwargs):
     If the `limit` keyword argument is set, it is used to stop the
     generator after the given number of result items.
 
+    If the `model` keyword argument is set, items are yielded as compact model objects (see
+    PythonConfluenceAPI.models) instead of dictionaries; pass a model class, or True to pick the model from the shape
+    of each item. Strings are interned and space objects shared across the whole stream.
+
+    If the `page_tuner` keyword argument is set to a PageSizeTuner (or True, for a default one), the page size is
+    adapted from the observed latency and response size of each page instead of reusing the limit echoed by the
+    server.
+
+    If the `deadline` keyword argument is set to a number of seconds (or a Deadline), the whole iteration must finish
+    within it: every page request gets at most the remaining time, and DeadlineExceeded is raised once it is gone.
+
+    API calls returning futures (ConfluenceFuturesAPI) are waited on page by page.
+
     >>> for i, v in enumerate(all_of(api.get_content)):
     >>>     v = bunchify(v)
     >>>     print('\t'.join((str(i), v.type, v.id, v.status, v.title)))
@@ -36,18 +110,40 @@ def all_of(api_call, *args, **kwargs):
     :param kwargs: Keyword arguments of the call.
     """
     kwargs = kwargs.copy()
+    model = kwargs.pop('model', None)
+    factory = ModelFactory() if model else None
+    model = None if model is True else model
+    tuner = kwargs.pop('page_tuner', None)
+    tuner = PageSizeTuner() if tuner is True else tuner
+    deadline = kwargs.pop('deadline', None)
+    if deadline is not None and not isinstance(deadline, Deadline):
+        deadline = Deadline(deadline)
     pos, outer_limit = 0, kwargs.get('limit', 0) or sys.maxsize
+    response_sizes = []
+    if tuner:
+        kwargs['limit'] = min(tuner.limit, outer_limit)
+        if not kwargs.get('callback'):
+            def measuring_callback(response):
+                response_sizes.append(len(response.content))
+                return json.loads(response.text) if response.text else None
+            kwargs['callback'] = measuring_callback
     while True:
-        response = api_call(*args, **kwargs)
+        start = default_timer()
+        response = resolve(within(deadline, api_call, *args, **kwargs)) or {}
+        latency = default_timer() - start
         for item in response.get('results', []):
             pos += 1
             if pos > outer_limit:
                 return
-            yield item
-        ##print((pos, response['start'], response['limit']))
-        if response.get('_links', {}).get('next', None):
+            yield factory.build(item, model) if factory else item
+        if response.get('_links', {}).get('next', None) and pos < outer_limit:
             kwargs['start'] = response['start'] + response['size']
-            kwargs['limit'] = response['limit']
+            if tuner:
+                tuner.observe(kwargs['limit'], response.get('limit'), response['size'], latency,
+                              response_sizes[-1] if response_sizes else None)
+                kwargs['limit'] = min(tuner.limit, outer_limit - pos)
+            else:
+                kwargs['limit'] = response['limit']
         else:
             return
 
@@ -58,21 +154,60 @@ class ConfluenceAPI(object):
     NEW_CONTENT_REQUIRED_KEYS = {"type", "title", "space", "body"}
     ATTACHMENT_METADATA_KEYS = {"id", "type", "version", "title"}
     UPDATE_CONTENT_REQUIRED_KEYS = {"id", "version"}
+    # Expansions of a pinned content version that can never change; anything else (space, ancestors, children,
+    # history, labels, restrictions...) reflects the current state of the content or its space and is never cached.
+    IMMUTABLE_EXPANSIONS = {"body", "version"}
 
-    def __init__(self, username, password, uri_base, user_agent=DEFAULT_USER_AGENT):
+    def __init__(self, username, password, uri_base, user_agent=DEFAULT_USER_AGENT, immutable_cache=None,
+                 metrics=None, middleware=None, timeout=None, pool_maxsize=10, http_adapter=None,
+                 auth=None):
         """
-        Initialize the API object.
+        Initialize the API object. The object may be shared between threads: the HTTP session is created once, under
+        a lock, and is not modified afterwards; set pool_maxsize to the number of threads sharing it.
         :param username: Your Confluence username.
         :param password: Your Confluence password.
         :param uri_base: The base url for your Confluence wiki (e.g. myorg.atlassian.com/wiki)
         :param user_agent: (Optional): The user-agent you wish to send on requests to the API.
                            DEFAULT: PythonConfluenceAPI.
+        :param immutable_cache: (Optional): A PythonConfluenceAPI.cache.ImmutableCache used to hold the results of
+                                calls that can never change (macros by hash/ID, version-pinned content). Entries are
+                                never revalidated, and are keyed by the username, so one cache may be shared between
+                                users. Default: None, no caching.
+        :param metrics: (Optional): A PythonConfluenceAPI.metrics.RequestMetrics object to record per end point
+                        request metrics into. Default: None, no metrics are recorded.
+        :param middleware: (Optional): A list of PythonConfluenceAPI.middleware.RequestMiddleware objects to run
+                           around every request, in order. Default: None, no middleware.
+        :param timeout: (Optional): The default requests timeout of every request: a number of seconds, or a
+                        (connect, read) tuple. Requests made under a PythonConfluenceAPI.deadline.Deadline get at most
+                        its remaining time. Default: None, no timeout.
+        :param pool_maxsize: (Optional): The number of connections kept open to the server; requests beyond it open
+                             throwaway connections. Default: 10.
+        :param http_adapter: (Optional): A requests HTTPAdapter to send requests through, e.g. one shared between
+                             several API objects. Overrides pool_maxsize. Default: None, create a new one.
+        :param auth: (Optional): A requests authentication object to use instead of HTTP Basic auth with the username
+                     and password, e.g. a PythonConfluenceAPI.auth.SessionCookieAuth. Default: None.
         """
         self.username = username
         self.password = password
         self.uri_base = uri_base if uri_base.endswith('/') else uri_base + "/"
         self.user_agent = user_agent
+        self.immutable_cache = immutable_cache
+        self.metrics = metrics
+        self.middleware = list(middleware or [])
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.http_adapter = http_adapter
+        self.auth = auth
         self.session = None
+        self._session_lock = threading.Lock()
+
+    def add_middleware(self, middleware):
+        """
+        Append a middleware object to the chain run around every request.
+        :param middleware: A PythonConfluenceAPI.middleware.RequestMiddleware object.
+        :return: None
+        """
+        self.middleware.append(middleware)
 
     def _start_http_session(self):
         """
@@ -80,11 +215,40 @@ class ConfluenceAPI(object):
         :return: None
         """
         api_logger.debug("Starting new HTTP session...")
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": self.user_agent})
-        if self.username and self.password:
+        session = requests.Session()
+        self._configure_session(session)
+        self.session = session
+
+    def _configure_session(self, session):
+        """
+        Set up a new session (headers, authorization and connection pool) before it is published to other threads.
+        :param session: The requests session.
+        :return: None
+        """
+        session.headers.update({"User-Agent": self.user_agent})
+        if self.auth is not None:
+            api_logger.debug("Requests will use {}.".format(type(self.auth).__name__))
+            session.auth = self.auth
+        elif self.username and self.password:
             api_logger.debug("Requests will use authorization.")
-            self.session.auth = HTTPBasicAuth(self.username, self.password)
+            session.auth = HTTPBasicAuth(self.username, self.password)
+        if self.http_adapter is None:
+            self.http_adapter = HTTPAdapter(pool_maxsize=self.pool_maxsize)
+        session.mount("http://", self.http_adapter)
+        session.mount("https://", self.http_adapter)
+
+    def _get_session(self):
+        """
+        Get the HTTP session, starting it on first use.
+        :return: The requests session.
+        """
+        session = self.session
+        if session is None:
+            with self._session_lock:
+                if self.session is None:
+                    self._start_http_session()
+                session = self.session
+        return session
 
     def _service_request(self, request_type, sub_uri, params=None, callback=None,
                          raise_for_status=True, raw=False, **kwargs):
@@ -105,13 +269,78 @@ class ConfluenceAPI(object):
         :return: The JSON decoded results or raw results, or the results of the passed in callback, if applicable.
                  May raise exceptions including requests.HTTPError on fault.
         """
-        api_logger.debug("Sending request: {} ({})".format(sub_uri, request_type))
-        if not self.session:
-            self._start_http_session()
+        if api_logger.isEnabledFor(logging.DEBUG):
+            api_logger.debug("Sending request: {} ({})".format(sub_uri, request_type))
+        session = self._get_session()
         uri = urljoin(self.uri_base, sub_uri)
         if params:
             kwargs.update(params=params)
-        response = self.session.request(request_type, uri, **kwargs)
+        request = ServiceRequest(request_type, sub_uri, uri, kwargs, session, current_deadline())
+        return self._execute_request(request, callback, raise_for_status, raw)
+
+    def _execute_request(self, request, callback, raise_for_status, raw):
+        """
+        Send a request through the middleware chain and handle the response, recording metrics if enabled.
+        :param request: The PythonConfluenceAPI.middleware.ServiceRequest to send.
+        :param callback: A callback function to be excuted on the resulting requests response, or None.
+        :param raise_for_status: When set True, we raise requests.HTTPError on 4xx or 5xx status.
+        :param raw: If no callback is set, return the raw content from the request if this is set True.
+        :return: The JSON decoded results or raw results, or the results of the passed in callback, if applicable.
+        """
+        metrics = self.metrics
+        if metrics is None:
+            response = self._send(request)
+            return self._handle_response(response, callback, raise_for_status, raw)
+        endpoint = request.endpoint
+        metrics.request_started(endpoint)
+        response = latency = decode_time = error = None
+        start = default_timer()
+        try:
+            response = self._send(request)
+            latency = default_timer() - start
+            decode_start = default_timer()
+            result = self._handle_response(response, callback, raise_for_status, raw)
+            decode_time = default_timer() - decode_start
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            metrics.request_finished(endpoint, request.method,
+                                     status=response.status_code if response is not None else None,
+                                     latency=latency, decode_time=decode_time, error=error,
+                                     response_bytes=len(response.content) if response is not None else 0)
+
+    def _send(self, request):
+        """
+        Apply the default timeout and the deadline of a request, and send it through the middleware chain.
+        :param request: The PythonConfluenceAPI.middleware.ServiceRequest to send.
+        :return: The requests response object.
+        """
+        deadline = request.deadline
+        timeout = request.kwargs.get("timeout", self.timeout)
+        if deadline is not None:
+            deadline.check()
+            timeout = deadline.limit(timeout)
+        if timeout is not None:
+            request.kwargs["timeout"] = timeout
+        try:
+            return run_middleware(self.middleware, request)
+        except requests.Timeout as e:
+            if deadline is not None and deadline.expired and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded("Deadline exceeded: {}".format(request.uri))
+            raise
+
+    @staticmethod
+    def _handle_response(response, callback, raise_for_status, raw):
+        """
+        Check and decode a response.
+        :param response: The requests response object.
+        :param callback: A callback function to be excuted on the response, or None.
+        :param raise_for_status: When set True, we raise requests.HTTPError on 4xx or 5xx status.
+        :param raw: If no callback is set, return the raw content from the request if this is set True.
+        :return: The JSON decoded results or raw results, or the results of the passed in callback, if applicable.
+        """
         response.encoding = 'utf-8'
         if raise_for_status:
             response.raise_for_status()
@@ -122,6 +351,64 @@ class ConfluenceAPI(object):
         else:
             return response.content if raw else json.loads(response.text)
 
+    def _wrap_result(self, result):
+        """
+        Wrap a result that is already available locally in the form the API methods return.
+        :param result: The decoded result.
+        :return: The result itself; subclasses may wrap it (e.g. in a completed future).
+        """
+        return result
+
+    def _cache_identity(self):
+        """
+        The principal requests are made as, which is part of every immutable cache key: users may see different
+        results (e.g. restricted pages) for the same request.
+        :return: The username, "" for anonymous access, or None if it cannot be told (an auth object without one).
+        """
+        if self.auth is not None:
+            return getattr(self.auth, "username", None)
+        return self.username if self.username and self.password else ""
+
+    def _immutable_expand(self, expand):
+        """
+        :param expand: A comma separated list of properties to expand on a pinned content version.
+        :return: True if every expansion is in IMMUTABLE_EXPANSIONS (or below body, e.g. body.storage).
+        """
+        return bool(expand) and all(element.strip().split(".")[0] == "body" or element.strip() in
+                                    self.IMMUTABLE_EXPANSIONS for element in expand.split(","))
+
+    def _immutable_get_request(self, sub_uri, params=None, callback=None):
+        """
+        GET request wrapper for end points whose results never change, served from the immutable cache when possible.
+
+        Callbacks are handed the requests response object, which is not cached, so calls with a callback always go
+        to the server, as do calls whose principal cannot be told (see _cache_identity).
+        :param sub_uri: The REST end point (sub-uri) to communicate with.
+        :param params: (Optional) HTTP Request parameters. Default: none
+        :param callback: (Optional) A callback function to be excuted on the resulting requests response.
+        :return: The results of the corresponding _service_request method, or the cached result.
+        """
+        cache = self.immutable_cache
+        identity = self._cache_identity()
+        if cache is None or callback is not None or identity is None:
+            return self._service_get_request(sub_uri, params=params, callback=callback)
+        key = "{}@{}".format(identity, urljoin(self.uri_base, sub_uri))
+        if params:
+            key += "?" + "&".join("{}={}".format(k, params[k]) for k in sorted(params))
+        cached = cache.get(key)
+        if cached is not None:
+            if api_logger.isEnabledFor(logging.DEBUG):
+                api_logger.debug("Immutable cache hit: {}".format(key))
+            return self._wrap_result(json.loads(cached))
+
+        def store_callback(response):
+            text = response.text
+            if not text:
+                return None
+            cache.set(key, text)
+            return json.loads(text)
+        return self._service_get_request(sub_uri, params=params, callback=store_callback)
+
     def _service_get_request(self, *args, **kwargs):
         """
         GET request wrapper
@@ -205,7 +492,9 @@ class ConfluenceAPI(object):
         Returns a piece of Content.
         :param content_id (string): The id of the content.
         :param status (string): OPTIONAL: List of Content statuses to filter results on. Default value: [current]
-        :param version (int): OPTIONAL: The content version to retrieve. Default: Latest.
+        :param version (int): OPTIONAL: The content version to retrieve. Default: Latest. Version-pinned requests
+                              that only expand IMMUTABLE_EXPANSIONS (e.g. body.storage,version) are served from the
+                              immutable cache, if one is configured.
         :param expand (string): OPTIONAL: A comma separated list of properties to expand on the content.
                                 Default value: history,space,version We can also specify some extensions such as
                                 extensions.inlineProperties (for getting inline comment-specific properties) or
@@ -222,6 +511,9 @@ class ConfluenceAPI(object):
             params["version"] = int(version)
         if expand:
             params["expand"] = expand
+        if version is not None and self._immutable_expand(expand):
+            return self._immutable_get_request("rest/api/content/{id}".format(id=content_id), params=params,
+                                               callback=callback)
         return self._service_get_request("rest/api/content/{id}".format(id=content_id), params=params,
                                          callback=callback)
 
@@ -267,8 +559,9 @@ class ConfluenceAPI(object):
         :return: The JSON data returned from the endpoint, or the results of the callback.
                  Will raise requests.HTTPError on bad input, potentially.
         """
-        return self._service_get_request("rest/api/content/{id}/history/{version}/macro/hash/{hash}"
-                                         "".format(id=content_id, version=version, hash=macro_hash), callback=callback)
+        return self._immutable_get_request("rest/api/content/{id}/history/{version}/macro/hash/{hash}"
+                                           "".format(id=content_id, version=version, hash=macro_hash),
+                                           callback=callback)
 
     def get_content_macro_by_macro_id(self, content_id, version, macro_id, callback=None):
         """
@@ -289,9 +582,9 @@ class ConfluenceAPI(object):
         :return: The JSON data returned from the endpoint, or the results of the callback.
                  Will raise requests.HTTPError on bad input, potentially.
         """
-        return self._service_get_request("rest/api/content/{id}/history/{version}/macro/id/{macro_id}"
-                                         "".format(id=content_id, version=int(version), macro_id=macro_id),
-                                         callback=callback)
+        return self._immutable_get_request("rest/api/content/{id}/history/{version}/macro/id/{macro_id}"
+                                           "".format(id=content_id, version=int(version), macro_id=macro_id),
+                                           callback=callback)
 
     def search_content(self, cql_str=None, cql_context=None, expand=None, start=0, limit=None, callback=None):
         """
@@ -663,7 +956,7 @@ class ConfluenceAPI(object):
         return self._service_get_request("rest/api/longtask/{id}".format(id=long_task_id), params=params,
                                          callback=callback)
 
-    def get_spaces(self, space_key=None, expand=None, start=None, limit=None, callback=None):
+    def get_spaces(self, space_key=None, expand=None, start=None, limit=None, status=None, callback=None):
         """
         Returns information about the spaces present in the Confluence instance.
         :param space_key (string): OPTIONAL: A list of space keys to filter on. Default: None.
@@ -672,6 +965,8 @@ class ConfluenceAPI(object):
         :param start (int): OPTIONAL: The start point of the collection to return. Default: 0.
         :param limit (int): OPTIONAL: A limit of the number of spaces to return, this could be restricted by fixed
                             system limits. Default: 25.
+        :param status (string): OPTIONAL: The status of the spaces to return: "current" or "archived".
+                                Default: current.
         :param callback: OPTIONAL: The callback to execute on the resulting data, before the method returns.
                          Default: None (no callback, raw data returned).
         :return: The JSON data returned from the space endpoint,
@@ -686,6 +981,8 @@ class ConfluenceAPI(object):
             params["start"] = int(start)
         if limit is not None:
             params["limit"] = int(limit)
+        if status:
+            params["status"] = status
         return self._service_get_request("rest/api/space", params=params, callback=callback)
 
     def get_space_information(self, space_key, expand=None, callback=None):
@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import json
+import os
+import tempfile
+import threading
+
+from requests.auth import AuthBase, _basic_auth_str
+
+from .api import api_logger
+
+
+class SessionCookieAuth(AuthBase):
+    def __init__(self, username, password, cookie_file=None):
+        """
+        Authenticate with HTTP Basic auth once, then reuse the session cookies the server hands out instead of
+        sending credentials with every request, which saves the server a credential check (e.g. an LDAP lookup) per
+        request. When the session expires (the server answers 401, or treats a cookie-only request as anonymous), the
+        request is transparently repeated with Basic auth and the new session cookies are kept.
+
+        With cookie_file set, the cookies are saved to (and picked up from) that file, so several worker processes can
+        share one server session.
+
+        >>> api = ConfluenceAPI(None, None, uri_base, auth=SessionCookieAuth("bot", "secret", "/tmp/bot.cookies"))
+
+        :param username: Your Confluence username.
+        :param password: Your Confluence password.
+        :param cookie_file: (Optional): A file to persist the session cookies in. Default: None, keep them in memory.
+        """
+        self.username = username
+        self.password = password
+        self.cookie_file = cookie_file
+        self.cookies = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cookie_file:
+            return
+        try:
+            mtime = os.path.getmtime(self.cookie_file)
+            if mtime == self._mtime:
+                return
+            with open(self.cookie_file) as f:
+                self.cookies = json.load(f)
+            self._mtime = mtime
+        except (IOError, OSError, ValueError):
+            pass
+
+    def _save(self):
+        if not self.cookie_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cookie_file))
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.cookies, f)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.cookie_file)
+            self._mtime = os.path.getmtime(self.cookie_file)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def _capture(self, response):
+        cookies = response.cookies.get_dict()
+        if not cookies:
+            return
+        with self._lock:
+            if any(self.cookies.get(name) != value for name, value in cookies.items()):
+                api_logger.debug("Storing session cookies {}.".format(", ".join(sorted(cookies))))
+                self.cookies.update(cookies)
+                self._save()
+
+    @staticmethod
+    def _expired(response):
+        return response.status_code == 401 or response.headers.get("X-AUSERNAME") == "anonymous"
+
+    def _handle_response(self, response, **kwargs):
+        request = response.request
+        if not getattr(request, "_cookie_auth", False) or not self._expired(response):
+            self._capture(response)
+            return response
+        api_logger.debug("Session expired, authenticating again.")
+        with self._lock:
+            self.cookies = {}
+        position = getattr(request, "_body_position", None)
+        if position is not None:
+            request.body.seek(position)
+        # Release the connection of the rejected response before repeating the request on it.
+        response.content
+        response.close()
+        retry = request.copy()
+        retry.headers.pop("Cookie", None)
+        retry.headers["Authorization"] = _basic_auth_str(self.username, self.password)
+        retried = response.connection.send(retry, **kwargs)
+        retried.history.append(response)
+        retried.request = retry
+        self._capture(retried)
+        return retried
+
+    def __call__(self, request):
+        with self._lock:
+            self._load()
+            cookies = dict(self.cookies)
+        if cookies:
+            sent = request.headers.get("Cookie")
+            names = set(part.split("=", 1)[0].strip() for part in sent.split(";")) if sent else set()
+            extra = "; ".join("{}={}".format(name, value) for name, value in cookies.items() if name not in names)
+            if extra:
+                request.headers["Cookie"] = "; ".join((sent, extra)) if sent else extra
+            request._cookie_auth = True
+            if hasattr(request.body, "seek") and hasattr(request.body, "tell"):
+                request._body_position = request.body.tell()
+        else:
+            request.headers["Authorization"] = _basic_auth_str(self.username, self.password)
+        request.register_hook("response", self._handle_response)
+        return request
@@ -0,0 +1,155 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+from collections import deque
+from timeit import default_timer
+from urllib.parse import urlsplit
+
+import requests
+
+from .api import api_logger
+from .middleware import RequestMiddleware
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request while the circuit breaker for its Confluence instance is open.
+    """
+
+
+class CircuitBreaker(RequestMiddleware):
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, failure_rate=0.5, slow_call_threshold=None, window=30.0, min_requests=20, reset_timeout=30.0,
+                 half_open_probes=3):
+        """
+        Middleware that stops sending requests to a failing or overloaded Confluence instance. The breaker watches
+        the outcome of recent requests and opens when the share of failures (connection errors, timeouts, 5xx and 429
+        answers, and optionally slow answers) reaches failure_rate. While open, requests fail immediately with
+        CircuitOpenError. After reset_timeout the breaker lets a few probe requests through (half-open); if they all
+        succeed it closes again, otherwise it opens for another reset_timeout. Probes that have not reported back
+        within reset_timeout (e.g. hung requests) are written off and a new round of probes is let through.
+
+        Add the breaker first in the middleware chain. Use CircuitBreaker.shared to share one breaker between all API
+        objects talking to the same instance.
+        :param failure_rate: (Optional): The share of failed requests that opens the breaker. Default: 0.5.
+        :param slow_call_threshold: (Optional): Requests taking longer than this many seconds count as failures.
+                                    Default: None, latency is ignored.
+        :param window: (Optional): The time window of outcomes considered, in seconds. Default: 30.
+        :param min_requests: (Optional): The number of requests in the window needed before the breaker can open.
+                             Default: 20.
+        :param reset_timeout: (Optional): The time the breaker stays open before probing, in seconds. Default: 30.
+        :param half_open_probes: (Optional): The number of successful probe requests needed to close the breaker.
+                                 Default: 3.
+        """
+        self.failure_rate = failure_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.window = window
+        self.min_requests = min_requests
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = None
+        self._probes_sent = 0
+        self._probes_passed = 0
+        self._probe_round = 0
+        self._probes_started = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, uri_base, **kwargs):
+        """
+        Get the breaker shared by all API objects talking to a Confluence instance, creating it if needed.
+        :param uri_base: The base URI of the instance (as passed to ConfluenceAPI).
+        :param kwargs: Options for a new breaker, see CircuitBreaker. Ignored if the breaker already exists.
+        :return: The CircuitBreaker for the instance.
+        """
+        parts = urlsplit(uri_base)
+        key = (parts.scheme, parts.netloc, parts.path.rstrip("/"))
+        with cls._registry_lock:
+            breaker = cls._registry.get(key)
+            if breaker is None:
+                breaker = cls._registry[key] = cls(**kwargs)
+            return breaker
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            if self._outcomes.popleft()[1]:
+                self._failures -= 1
+
+    def _open(self, now):
+        api_logger.warning("Circuit breaker opened, failing requests fast for {}s.".format(self.reset_timeout))
+        self.state = OPEN
+        self._opened_at = now
+
+    def _start_probes(self, now):
+        self.state = HALF_OPEN
+        self._probes_sent = self._probes_passed = 0
+        self._probe_round += 1
+        self._probes_started = now
+
+    def _record(self, request, failed):
+        now = default_timer()
+        with self._lock:
+            probe_round = request.context.pop("circuit_probe", None)
+            if probe_round is not None:
+                # Probes of an earlier round were written off when it timed out.
+                if self.state != HALF_OPEN or probe_round != self._probe_round:
+                    return
+                if failed:
+                    self._open(now)
+                    return
+                self._probes_passed += 1
+                if self._probes_passed >= self.half_open_probes:
+                    api_logger.info("Circuit breaker closed.")
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._trim(now)
+            if (len(self._outcomes) >= self.min_requests
+                    and self._failures >= self.failure_rate * len(self._outcomes)):
+                self._open(now)
+
+    def before_request(self, request):
+        now = default_timer()
+        with self._lock:
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._start_probes(now)
+            if self.state == HALF_OPEN:
+                if self._probes_sent >= self.half_open_probes:
+                    if now - self._probes_started < self.reset_timeout:
+                        raise CircuitOpenError("Circuit breaker is half-open, waiting for probes: {}".format(
+                            request.uri))
+                    api_logger.warning("Circuit breaker probes did not report back within {}s, probing again."
+                                       "".format(self.reset_timeout))
+                    self._start_probes(now)
+                self._probes_sent += 1
+                request.context["circuit_probe"] = self._probe_round
+            elif self.state == OPEN:
+                raise CircuitOpenError("Circuit breaker is open: {}".format(request.uri))
+        request.context["circuit_start"] = now
+        return None
+
+    def after_response(self, request, response):
+        failed = response.status_code >= 500 or response.status_code == 429
+        if not failed and self.slow_call_threshold is not None:
+            failed = default_timer() - request.context["circuit_start"] > self.slow_call_threshold
+        self._record(request, failed)
+        return response
+
+    def on_error(self, request, error):
+        if "circuit_start" in request.context:
+            self._record(request, isinstance(error, (requests.ConnectionError, requests.Timeout)))
+        return None
@@ -0,0 +1,186 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .api import api_logger, all_of
+from .deadline import current_deadline, within
+from .metrics import endpoint_template
+from .utils import resolve
+
+# Status codes answered when the server wants clients to slow down.
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class DeleteSkippedError(Exception):
+    """
+    The error of a DeleteResult for a page delete_subtree did not try to delete, because one of its descendants could
+    not be deleted.
+    """
+
+
+class DeleteResult(object):
+    __slots__ = ("content_id", "trashed", "purged", "attempts", "error")
+
+    def __init__(self, content_id):
+        """
+        The outcome of deleting one piece of content with bulk_delete. error is None on success, and otherwise the
+        exception the deletion failed with (a DeleteSkippedError for pages delete_subtree skipped).
+        :param content_id: The ID of the content.
+        """
+        self.content_id = content_id
+        self.trashed = False
+        self.purged = False
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "DeleteResult(content_id={!r}, trashed={}, purged={}, error={!r})".format(
+            self.content_id, self.trashed, self.purged, self.error)
+
+
+class _Throttle(object):
+    def __init__(self, rate=None):
+        """
+        Spaces requests shared by several worker threads to at most rate per second, and lets a throttled answer
+        pause all of them.
+        :param rate: (Optional): The maximum number of requests per second. Default: None, no limit.
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._next = max(self._next, time.time() + seconds)
+
+
+def _retry_after(response, attempt):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return min(60.0, 2.0 ** attempt)
+
+
+def _delete(api, result, status, throttle, max_retries):
+    metrics = getattr(api, "metrics", None)
+    while True:
+        throttle.wait()
+        result.attempts += 1
+        try:
+            resolve(api.delete_content_by_id(result.content_id, status=status))
+            return True
+        except requests.HTTPError as e:
+            response = e.response
+            if (response is not None and response.status_code in THROTTLE_STATUS_CODES
+                    and result.attempts <= max_retries):
+                delay = _retry_after(response, result.attempts)
+                api_logger.debug("Throttled deleting {}, backing off {}s.".format(result.content_id, delay))
+                throttle.pause(delay)
+                if metrics is not None:
+                    metrics.record_retry(endpoint_template("rest/api/content/{}".format(result.content_id)))
+                continue
+            result.error = e
+        except Exception as e:
+            result.error = e
+        return False
+
+
+def bulk_delete(api, content_ids, purge=False, max_workers=8, rate=None, max_retries=3):
+    """
+    Delete many pieces of content concurrently. All content is moved to the trash first; with purge set, the content
+    that was trashed is then purged from the trash (delete_content_by_id with status="trashed").
+
+    Throttled answers (429 or 503) are retried up to max_retries times after the Retry-After delay (or an exponential
+    back off), and pause every worker, not just the one that was throttled. Other errors are not retried. The
+    deadline of the caller, if any, applies to every request; content not reached in time is reported with a
+    DeadlineExceeded error.
+
+    >>> failed = [r for r in bulk_delete(api, stale_ids, purge=True, rate=20) if not r.ok]
+
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object to delete with.
+    :param content_ids: An iterable of content IDs.
+    :param purge: (Optional): Purge the content from the trash after trashing it. Default: False.
+    :param max_workers: (Optional): The maximum number of requests in flight. Default: 8.
+    :param rate: (Optional): The maximum number of requests per second. Default: None, no limit.
+    :param max_retries: (Optional): The maximum number of retries of a throttled request. Default: 3.
+    :return: A list of DeleteResult objects, in the order of content_ids.
+    """
+    results = [DeleteResult(content_id) for content_id in content_ids]
+    throttle = _Throttle(rate)
+    deadline = current_deadline()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def trash(result):
+            result.trashed = _delete(api, result, None, throttle, max_retries)
+
+        def purge_trashed(result):
+            result.purged = _delete(api, result, "trashed", throttle, max_retries)
+        list(executor.map(lambda result: within(deadline, trash, result), results))
+        if purge:
+            list(executor.map(lambda result: within(deadline, purge_trashed, result),
+                              [result for result in results if result.trashed]))
+    failed = sum(1 for result in results if not result.ok)
+    api_logger.debug("Deleted {} of {} items.".format(len(results) - failed, len(results)))
+    return results
+
+
+def delete_subtree(api, content_id, include_root=True, purge=False, max_workers=8, rate=None, max_retries=3):
+    """
+    Delete a page and all its descendant pages, children first: the descendants (found with
+    get_content_descendants_by_type) are deleted level by level from the deepest up, each level concurrently with
+    bulk_delete. A page is skipped, and reported with a DeleteSkippedError, when one of its descendants could not be
+    deleted.
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object to delete with.
+    :param content_id: The ID of the root page.
+    :param include_root: (Optional): Delete the root page as well. Default: True.
+    :param purge: (Optional): Purge the pages from the trash after trashing them. Default: False.
+    :param max_workers: (Optional): The maximum number of requests in flight. Default: 8.
+    :param rate: (Optional): The maximum number of requests per second. Default: None, no limit.
+    :param max_retries: (Optional): The maximum number of retries of a throttled request. Default: 3.
+    :return: A list of DeleteResult objects, deepest pages first.
+    """
+    content_id = str(content_id)
+    levels = defaultdict(list)
+    ancestors = {}
+    for page in all_of(api.get_content_descendants_by_type, content_id, "page", expand="ancestors"):
+        chain = [ancestor["id"] for ancestor in page.get("ancestors", [])]
+        ancestors[page["id"]] = chain
+        levels[len(chain)].append(page["id"])
+    if include_root:
+        ancestors[content_id] = []
+        levels[0].append(content_id)
+    blocked = set()
+    results = []
+    for depth in sorted(levels, reverse=True):
+        skipped = []
+        runnable = []
+        for page_id in levels[depth]:
+            (skipped if page_id in blocked else runnable).append(page_id)
+        level_results = bulk_delete(api, runnable, purge, max_workers, rate, max_retries)
+        for page_id in skipped:
+            result = DeleteResult(page_id)
+            result.error = DeleteSkippedError("Not deleted, a descendant of {} could not be deleted.".format(page_id))
+            level_results.append(result)
+        for result in level_results:
+            if not result.ok:
+                blocked.update(ancestors.get(result.content_id, ()))
+        results.extend(level_results)
+    return results
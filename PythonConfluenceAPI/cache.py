@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ImmutableCache(object):
+    """
+    Base class for caches of immutable API results.
+
+    Entries are keyed by a string and hold the serialized (JSON text) response of an endpoint whose result can never
+    change, e.g. a macro body addressed by content ID and version. Since the data is immutable there is no expiry and
+    no revalidation; backends only need to implement get and set.
+    """
+
+    def get(self, key):
+        """
+        Look up a cached entry.
+        :param key: The cache key (string).
+        :return: The cached JSON text, or None if the key is not present.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """
+        Store a cache entry.
+        :param key: The cache key (string).
+        :param value: The JSON text to store.
+        :return: None
+        """
+        raise NotImplementedError
+
+
+class MemoryCache(ImmutableCache):
+    def __init__(self, max_entries=10000):
+        """
+        Initialize a thread-safe in-process LRU cache.
+        :param max_entries: (Optional): The maximum number of entries to keep before the least recently used entries
+                            are evicted. None for unbounded. Default: 10000.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(ImmutableCache):
+    def __init__(self, directory):
+        """
+        Initialize a cache stored as one file per entry in a directory, so it may be shared between worker processes
+        on the same host (or on a shared volume). Writes are atomic, so concurrent writers never expose partial entries.
+        :param directory: The directory to store cache entries in. Created if it does not exist.
+        """
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read().decode('utf-8')
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        subdirectory = os.path.dirname(path)
+        if not os.path.isdir(subdirectory):
+            try:
+                os.makedirs(subdirectory)
+            except OSError:
+                if not os.path.isdir(subdirectory):
+                    raise
+        fd, temp_path = tempfile.mkstemp(dir=subdirectory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value.encode('utf-8'))
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
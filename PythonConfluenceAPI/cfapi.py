@@ -1,43 +1,60 @@
 from __future__ import absolute_import
-import future.standard_library
-future.standard_library.install_aliases()
 
 __author__ = 'Robert Cope'
 
-from requests.auth import HTTPBasicAuth
+import logging
+import pickle
+from collections import namedtuple
+from concurrent.futures import Future
+import requests
+from requests.structures import CaseInsensitiveDict
 from .api import ConfluenceAPI, api_logger, json
+from .deadline import current_deadline
+from .hedge import _Scheduler
+from .middleware import ServiceRequest
+from . import compose
 from requests_futures.sessions import FuturesSession
 from urllib.parse import urljoin
 
 
-# By default requests-futures request method returns the response object instead of the results of the callback;
-# this is undesirable here, since the callback result is really the expected end result. This patches the module
-# to get that expected behavior.
-def request_patch(self, *args, **kwargs):
-    """Maintains the existing api for Session.request.
-    Used by all of the higher level methods, e.g. Session.get.
-    The background_callback param allows you to do some processing on the
-    response in the background, e.g. call resp.json() so that json parsing
-    happens in the background thread.
-    """
-    func = sup = super(FuturesSession, self).request
+# Cancels queued requests whose deadline has passed.
+_deadline_scheduler = _Scheduler()
+
+OffloadedPayload = namedtuple("OffloadedPayload", ["content", "status_code", "headers", "url", "callback", "raw"])
 
-    background_callback = kwargs.pop('background_callback', None)
-    if background_callback:
-        def wrap(*args_, **kwargs_):
-            resp = sup(*args_, **kwargs_)
-            # Patch the closure to return the callback.
-            return background_callback(self, resp)
 
-        func = wrap
-    return self.executor.submit(func, *args, **kwargs)
+def _picklable(callback):
+    try:
+        pickle.dumps(callback)
+        return True
+    except Exception:
+        return False
 
-FuturesSession.request = request_patch
+
+def decode_payload(payload):
+    """
+    Decode an OffloadedPayload; this runs in the decode executor's worker processes.
+    :param payload: The OffloadedPayload holding the raw response content.
+    :return: The JSON decoded results or raw results, or the results of the callback, if applicable.
+    """
+    if payload.callback:
+        response = requests.Response()
+        response._content = payload.content
+        response.status_code = payload.status_code
+        response.headers = CaseInsensitiveDict(payload.headers)
+        response.url = payload.url
+        response.encoding = 'utf-8'
+        return payload.callback(response)
+    elif not payload.content and not payload.raw:
+        return None
+    return payload.content if payload.raw else json.loads(payload.content.decode('utf-8'))
 
 
 class ConfluenceFuturesAPI(ConfluenceAPI):
     def __init__(self, username, password, uri_base, user_agent=ConfluenceAPI.DEFAULT_USER_AGENT,
-                 executor=None, max_workers=10):
+                 executor=None, max_workers=10, immutable_cache=None, metrics=None, middleware=None,
+                 decode_executor=None, decode_offload_threshold=65536, hedge=None, timeout=None, pool_maxsize=None,
+                 http_adapter=None, auth=None):
         """
         Initialize the async concurrent.futures API object.
         :param username: Your Confluence username.
@@ -49,10 +66,44 @@ class ConfluenceFuturesAPI(ConfluenceAPI):
                          new ThreadPoolExecutor.
         :param max_workers: (Optional): If the executor is not specified and the default ThreadPoolExecutor is spawned,
                             this specifies the number of worker threads to create.
+        :param immutable_cache: (Optional): A PythonConfluenceAPI.cache.ImmutableCache used to hold the results of
+                                calls that can never change. Cache hits are returned as already completed futures.
+                                Default: None, no caching.
+        :param metrics: (Optional): A PythonConfluenceAPI.metrics.RequestMetrics object to record per end point
+                        request metrics into. Default: None, no metrics are recorded.
+        :param middleware: (Optional): A list of PythonConfluenceAPI.middleware.RequestMiddleware objects to run
+                           around every request, in order. Middleware runs in the executor's worker threads.
+                           Default: None, no middleware.
+        :param decode_executor: (Optional): A concurrent.futures.ProcessPoolExecutor to run JSON decoding and
+                                callbacks in, so the HTTP worker threads stay I/O bound and decoding scales across
+                                cores. The raw response bytes are passed to the pool and a response object is rebuilt
+                                there for callbacks; callbacks that cannot be pickled (e.g. closures) still run in the
+                                HTTP worker thread. Default: None, decode in the HTTP worker thread.
+        :param decode_offload_threshold: (Optional): Responses smaller than this many bytes are decoded in the HTTP
+                                         worker thread, as shipping them to another process costs more than decoding.
+                                         Default: 65536.
+        :param hedge: (Optional): A PythonConfluenceAPI.hedge.HedgePolicy; slow GET requests are then duplicated
+                      and the first answer wins, trading a little extra load for a shorter latency tail.
+                      Default: None, no hedging.
+        :param timeout: (Optional): The default requests timeout of every request: a number of seconds, or a
+                        (connect, read) tuple. Requests made under a PythonConfluenceAPI.deadline.Deadline get at most
+                        its remaining time, and are cancelled if still queued when it passes. Default: None, no timeout.
+        :param pool_maxsize: (Optional): The number of connections kept open to the server. Default: None, one per
+                             worker thread (max_workers, or the size of a given ThreadPoolExecutor).
+        :param http_adapter: (Optional): A requests HTTPAdapter to send requests through, e.g. one shared between
+                             several API objects. Overrides pool_maxsize. Default: None, create a new one.
+        :param auth: (Optional): A requests authentication object to use instead of HTTP Basic auth with the username
+                     and password, e.g. a PythonConfluenceAPI.auth.SessionCookieAuth. Default: None.
         """
-        super(ConfluenceFuturesAPI, self).__init__(username, password, uri_base, user_agent)
+        super(ConfluenceFuturesAPI, self).__init__(username, password, uri_base, user_agent, immutable_cache,
+                                                   metrics, middleware, timeout,
+                                                   pool_maxsize or getattr(executor, "_max_workers", max_workers),
+                                                   http_adapter, auth)
         self.executor = executor
         self.max_workers = max_workers
+        self.decode_executor = decode_executor
+        self.decode_offload_threshold = decode_offload_threshold
+        self.hedge = hedge
 
     def _start_http_session(self):
         """
@@ -60,11 +111,61 @@ class ConfluenceFuturesAPI(ConfluenceAPI):
         :return: None
         """
         api_logger.debug("Starting new HTTP session...")
-        self.session = FuturesSession(executor=self.executor, max_workers=self.max_workers)
-        self.session.headers.update({"User-Agent": self.user_agent})
-        if self.username and self.password:
-            api_logger.debug("Requests will use authorization.")
-            self.session.auth = HTTPBasicAuth(self.username, self.password)
+        session = FuturesSession(executor=self.executor, max_workers=self.max_workers)
+        self._configure_session(session)
+        self.session = session
+
+    def _wrap_result(self, result):
+        """
+        Wrap a result that is already available locally in a completed future.
+        :param result: The decoded result.
+        :return: A concurrent.futures.Future already holding the result.
+        """
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def then(self, future, fn, executor=None):
+        """
+        Chain a follow-up step (typically another API call) onto an API future without blocking a thread on it.
+        See PythonConfluenceAPI.compose.then.
+        :param future: The future to chain on.
+        :param fn: The function to call with the result; it may return another future.
+        :param executor: (Optional): An executor to run fn in. Default: None, run fn in the completing thread.
+        :return: A future for the (flattened) result of fn.
+        """
+        return compose.then(future, fn, executor)
+
+    def map(self, fn, iterable, executor=None):
+        """
+        Call fn (typically making an API call) for every item and gather the (flattened) results.
+        See PythonConfluenceAPI.compose.map_futures.
+        :param fn: The function to call with each item; it may return a future.
+        :param iterable: The items.
+        :param executor: (Optional): An executor to call fn in. Default: None, call fn in the calling thread.
+        :return: A future for the list of results, in the order of the items.
+        """
+        return compose.map_futures(fn, iterable, executor)
+
+    @staticmethod
+    def gather(futures, cancel_on_error=False):
+        """
+        Combine API futures into one future for the list of their results. See PythonConfluenceAPI.compose.gather.
+        :param futures: An iterable of futures.
+        :param cancel_on_error: (Optional): Cancel the remaining futures once one fails. Default: False.
+        :return: A future for the list of results.
+        """
+        return compose.gather(futures, cancel_on_error)
+
+    @staticmethod
+    def as_completed(futures, timeout=None):
+        """
+        Iterate over API futures as they complete. See PythonConfluenceAPI.compose.as_completed.
+        :param futures: An iterable of futures.
+        :param timeout: (Optional): The maximum number of seconds to wait in total. Default: None, no limit.
+        :return: An iterator yielding the futures as they complete.
+        """
+        return compose.as_completed(futures, timeout)
 
     def _service_request(self, request_type, sub_uri, params=None, callback=None,
                          raise_for_status=True, raw=False, **kwargs):
@@ -84,23 +185,56 @@ class ConfluenceFuturesAPI(ConfluenceAPI):
         :param kwargs: Additional parameters to pass to the session request call.
         :return: The concurrent.futures object that holds the future for the API method call.
         """
-        api_logger.debug("Sending request: {} ({})".format(sub_uri, request_type))
-        if not self.session:
-            self._start_http_session()
+        if api_logger.isEnabledFor(logging.DEBUG):
+            api_logger.debug("Sending request: {} ({})".format(sub_uri, request_type))
+        session = self._get_session()
         uri = urljoin(self.uri_base, sub_uri)
         if params:
             kwargs.update(params=params)
-        if callback:
-            def base_callback(_, response):
-                if raise_for_status:
-                    response.raise_for_status()
-                response.encoding = 'utf-8'
-                return callback(response)
+        deadline = current_deadline()
+        request = ServiceRequest(request_type, sub_uri, uri, kwargs, session, deadline)
+        if self.hedge is not None and self.hedge.applies_to(request_type, request.endpoint):
+            # Every attempt gets its own request object, so middleware state is not shared between duplicates.
+            response_future = self.hedge.submit(
+                session.executor, request.endpoint,
+                lambda: self._execute_request(ServiceRequest(request_type, sub_uri, uri, dict(kwargs), session,
+                                                             deadline), callback, raise_for_status, raw))
         else:
-            def base_callback(_, response):
-                if raise_for_status:
-                    response.raise_for_status()
-                response.encoding = 'utf-8'
-                return response.content if raw else json.loads(response.text)
-        response_future = self.session.request(request_type, uri, background_callback=base_callback, **kwargs)
-        return response_future
+            response_future = session.executor.submit(self._execute_request, request, callback,
+                                                           raise_for_status, raw)
+        if deadline is not None:
+            timer = _deadline_scheduler.schedule(deadline.remaining(), response_future.cancel)
+            response_future.add_done_callback(lambda f: _deadline_scheduler.cancel(timer))
+        if self.decode_executor is None:
+            return response_future
+        return compose.then(response_future, self._submit_offloaded_payload)
+
+    def _handle_response(self, response, callback, raise_for_status, raw):
+        """
+        Check a response and either decode it here, or package its raw content to be decoded in the decode executor.
+        :param response: The requests response object.
+        :param callback: A callback function to be excuted on the response, or None.
+        :param raise_for_status: When set True, we raise requests.HTTPError on 4xx or 5xx status.
+        :param raw: If no callback is set, return the raw content from the request if this is set True.
+        :return: The decoded result, or an OffloadedPayload.
+        """
+        parent = super(ConfluenceFuturesAPI, self)
+        if self.decode_executor is None or (raw and not callback) or (callback and not _picklable(callback)):
+            return parent._handle_response(response, callback, raise_for_status, raw)
+        response.encoding = 'utf-8'
+        if raise_for_status:
+            response.raise_for_status()
+        if len(response.content) < self.decode_offload_threshold:
+            return parent._handle_response(response, callback, False, raw)
+        return OffloadedPayload(response.content, response.status_code, dict(response.headers), response.url,
+                                callback, raw)
+
+    def _submit_offloaded_payload(self, value):
+        """
+        Send an OffloadedPayload to the decode executor; other (already decoded) values are passed through.
+        :param value: The value returned by _execute_request.
+        :return: A future for the decoded payload, or the value itself.
+        """
+        if isinstance(value, OffloadedPayload):
+            return self.decode_executor.submit(decode_payload, value)
+        return value
@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+import concurrent.futures
+from concurrent.futures import Future
+
+
+def is_future(value):
+    """
+    Check whether a value is a future (as returned by ConfluenceFuturesAPI methods).
+    :param value: Any value.
+    :return: True if the value can be chained on.
+    """
+    return hasattr(value, "add_done_callback") and hasattr(value, "result")
+
+
+def _set_result(target, value):
+    # The caller may have cancelled a chained future; its outcome is then discarded.
+    if not target.done():
+        try:
+            target.set_result(value)
+        except concurrent.futures.InvalidStateError:
+            pass
+
+
+def _set_exception(target, error):
+    if not target.done():
+        try:
+            target.set_exception(error)
+        except concurrent.futures.InvalidStateError:
+            pass
+
+
+def _transfer(source, target):
+    """
+    Complete target with the outcome of the finished future source.
+    """
+    if source.cancelled():
+        target.cancel()
+        return
+    error = source.exception()
+    if error is not None:
+        _set_exception(target, error)
+    else:
+        _set_result(target, source.result())
+
+
+def _resolve_into(value, target):
+    """
+    Complete target with value, waiting (without blocking) on it first if value is itself a future.
+    """
+    if is_future(value):
+        value.add_done_callback(lambda f: _transfer(f, target))
+    else:
+        _set_result(target, value)
+
+
+def then(future, fn, executor=None):
+    """
+    Chain a follow-up step onto a future without blocking a thread on it.
+
+    When the future completes successfully, fn is called with its result. If fn returns another future (e.g. it makes
+    another API call through ConfluenceFuturesAPI), the returned future completes when that one does, so dependent
+    requests can be chained to any depth:
+
+    >>> children = then(api.get_content(title="Home", space_key="TST"),
+    >>>                 lambda page: api.get_content_children(page["results"][0]["id"], expand="page"))
+
+    Errors and cancellation of the source future propagate to the returned future without calling fn.
+    :param future: The future to chain on.
+    :param fn: The function to call with the result.
+    :param executor: (Optional): An executor to run fn in. Default: None, run fn in the thread that completed the
+                     future, which is cheap when fn only starts further asynchronous calls.
+    :return: A future for the (flattened) result of fn.
+    """
+    outer = Future()
+
+    def run(result):
+        try:
+            value = fn(result)
+        except Exception as e:
+            _set_exception(outer, e)
+            return
+        _resolve_into(value, outer)
+
+    def on_done(f):
+        if f.cancelled():
+            outer.cancel()
+            return
+        error = f.exception()
+        if error is not None:
+            _set_exception(outer, error)
+        elif executor is not None:
+            try:
+                executor.submit(run, f.result())
+            except Exception as e:
+                _set_exception(outer, e)
+        else:
+            run(f.result())
+    future.add_done_callback(on_done)
+    return outer
+
+
+def gather(futures, cancel_on_error=False):
+    """
+    Combine futures into one future for the list of their results, in the given order.
+
+    The returned future fails with the first error raised by any of the futures.
+    :param futures: An iterable of futures (plain values are accepted and passed through).
+    :param cancel_on_error: (Optional): Cancel the remaining futures once one fails. Default: False.
+    :return: A future for the list of results.
+    """
+    futures = list(futures)
+    outer = Future()
+    results = [None] * len(futures)
+    state = {"remaining": len(futures)}
+    lock = threading.Lock()
+    if not futures:
+        outer.set_result(results)
+        return outer
+
+    def on_done(index, f):
+        with lock:
+            if outer.done():
+                return
+            if f.cancelled():
+                error = concurrent.futures.CancelledError()
+            else:
+                error = f.exception()
+            if error is not None:
+                _set_exception(outer, error)
+            else:
+                results[index] = f.result()
+                state["remaining"] -= 1
+                if state["remaining"]:
+                    return
+                _set_result(outer, results)
+                return
+        if cancel_on_error:
+            for other in futures:
+                if is_future(other):
+                    other.cancel()
+
+    for index, value in enumerate(futures):
+        if is_future(value):
+            value.add_done_callback(lambda f, i=index: on_done(i, f))
+        else:
+            done = Future()
+            done.set_result(value)
+            on_done(index, done)
+    return outer
+
+
+def map_futures(fn, iterable, executor=None):
+    """
+    Call fn for every item and gather the (flattened) results, e.g. to fetch the children of every page of a listing.
+
+    >>> children = map_futures(lambda page: api.get_content_children(page["id"], expand="page"), pages)
+
+    :param fn: The function to call with each item; it may return a future.
+    :param iterable: The items.
+    :param executor: (Optional): An executor to call fn in. Default: None, call fn in the calling thread.
+    :return: A future for the list of results, in the order of the items.
+    """
+    futures = []
+    for item in iterable:
+        source = Future()
+        source.set_result(item)
+        futures.append(then(source, fn, executor))
+    return gather(futures)
+
+
+def as_completed(futures, timeout=None):
+    """
+    Iterate over futures as they complete (see concurrent.futures.as_completed); chained futures created by then,
+    gather and map_futures are supported as well.
+    :param futures: An iterable of futures.
+    :param timeout: (Optional): The maximum number of seconds to wait in total. Default: None, no limit.
+    :return: An iterator yielding the futures as they complete.
+    """
+    return concurrent.futures.as_completed(list(futures), timeout=timeout)
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+from timeit import default_timer
+
+import requests
+
+_local = threading.local()
+
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    Raised when a request is made, or times out, after the deadline of its operation has passed.
+    """
+
+
+class Deadline(object):
+    def __init__(self, seconds):
+        """
+        A point in time by which an operation must finish. Used as a context manager, the deadline applies to every
+        request made in the block (including the pages of all_of and the requests of the bulk and parallel helpers):
+        each request gets at most the remaining time as its timeout, and fails with DeadlineExceeded once it is gone.
+        Nested deadlines never extend an outer one.
+
+        >>> with Deadline(60):
+        >>>     pages = list(all_of(api.get_content, space_key="TST"))
+
+        :param seconds: The time allowed, in seconds from now.
+        """
+        self.expires_at = default_timer() + seconds
+
+    def remaining(self):
+        """
+        :return: The time left, in seconds (0 once expired).
+        """
+        return max(0.0, self.expires_at - default_timer())
+
+    @property
+    def expired(self):
+        return default_timer() >= self.expires_at
+
+    def check(self):
+        """
+        Raise DeadlineExceeded if the deadline has passed.
+        :return: None
+        """
+        if self.expired:
+            raise DeadlineExceeded("Deadline exceeded")
+
+    def limit(self, timeout=None):
+        """
+        Cap a requests timeout to the remaining time.
+        :param timeout: A requests timeout: None, a number of seconds, or a (connect, read) tuple.
+        :return: The capped timeout.
+        """
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(self if parent is None or self.expires_at <= parent.expires_at else parent)
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.stack.pop()
+
+
+def current_deadline():
+    """
+    :return: The deadline in effect in the calling thread, or None.
+    """
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def within(deadline, fn, *args, **kwargs):
+    """
+    Call fn with a deadline in effect, e.g. to carry the caller's deadline into an executor's worker thread.
+    :param deadline: A Deadline, or None.
+    :param fn: The function to call.
+    :return: The result of fn.
+    """
+    if deadline is None:
+        return fn(*args, **kwargs)
+    with deadline:
+        return fn(*args, **kwargs)
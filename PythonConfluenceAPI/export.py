@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import io
+import json
+import os
+
+from .api import api_logger
+
+DEFAULT_FIELDS = ("id", "type", "status", "title", "space.key", "version.number", "version.when")
+
+# Column types of the known fields, as pyarrow type factory names; other fields are written as strings (JSON text for
+# values that are not strings), so the schema never depends on the data.
+FIELD_TYPES = {"id": "string", "type": "string", "status": "string", "title": "string", "space.key": "string",
+               "version.number": "int64", "version.when": "string", "version.minorEdit": "bool_"}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("Columnar export requires pyarrow; install it with "
+                          "'pip install PythonConfluenceAPI[columnar]'.")
+    return pyarrow
+
+
+def _as_dict(item):
+    return item.to_dict() if hasattr(item, "to_dict") else item
+
+
+def project(item, fields):
+    """
+    Select fields from a result item.
+    :param item: A result dictionary (or a model/lazy object with a to_dict method).
+    :param fields: An iterable of field names; dotted names select nested values (e.g. "space.key").
+    :return: A flat dictionary keyed by field name. Missing fields map to None.
+    """
+    item = _as_dict(item)
+    row = {}
+    for field in fields:
+        value = item
+        for name in field.split("."):
+            value = value.get(name) if isinstance(value, dict) else None
+            if value is None:
+                break
+        row[field] = value
+    return row
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_ndjson(items, destination, fields=None, batch_size=1000):
+    """
+    Write a stream of results (e.g. an all_of generator) as newline delimited JSON, one item per line.
+
+    Items are consumed and written in batches of batch_size, so memory use is bounded by the batch rather than the
+    whole result set.
+    :param items: An iterable of result dictionaries (or model/lazy objects).
+    :param destination: A path (str or os.PathLike) or a writable text file object.
+    :param fields: (Optional): Field names to project each item onto (see project). Default: None, whole items.
+    :param batch_size: (Optional): The number of lines buffered between writes. Default: 1000.
+    :return: The number of items written.
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        with io.open(destination, "w", encoding="utf-8") as f:
+            return export_ndjson(items, f, fields, batch_size)
+    count = 0
+    for batch in _batches(items, batch_size):
+        rows = [project(item, fields) if fields else _as_dict(item) for item in batch]
+        destination.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+        count += len(rows)
+    api_logger.debug("Exported {} items as NDJSON.".format(count))
+    return count
+
+
+def _default_schema(pa, fields):
+    return pa.schema([(field, getattr(pa, FIELD_TYPES.get(field, "string"))()) for field in fields])
+
+
+def _column(pa, values, column_type):
+    if pa.types.is_string(column_type):
+        values = [value if value is None or isinstance(value, str) else json.dumps(value, separators=(",", ":"))
+                  for value in values]
+    return pa.array(values, type=column_type)
+
+
+def _record_batches(pa, items, fields, batch_size, schema):
+    schema = _default_schema(pa, fields) if schema is None else schema
+    for batch in _batches(items, batch_size):
+        columns = dict((field, []) for field in fields)
+        for item in batch:
+            row = project(item, fields)
+            for field in fields:
+                columns[field].append(row[field])
+        yield pa.table([_column(pa, columns[f], schema.field(f).type) for f in fields], schema=schema)
+
+
+def export_parquet(items, destination, fields=DEFAULT_FIELDS, row_group_size=10000, schema=None,
+                   compression="snappy"):
+    """
+    Write a stream of results (e.g. an all_of generator) to a Parquet file, one row group per row_group_size items.
+
+    Only one row group is held in memory at a time. Requires pyarrow.
+    :param items: An iterable of result dictionaries (or model/lazy objects).
+    :param destination: A path or a writable binary file object.
+    :param fields: (Optional): Field names to write as columns (see project).
+                   Default: id, type, status, title, space.key, version.number, version.when.
+    :param row_group_size: (Optional): The number of items per row group. Default: 10000.
+    :param schema: (Optional): A pyarrow.Schema for the columns. Default: None, the FIELD_TYPES of known fields and
+                   strings for the others. Values of string columns that are not strings are written as JSON.
+    :param compression: (Optional): The Parquet compression codec. Default: "snappy".
+    :return: The number of items written.
+    """
+    pa = _import_pyarrow()
+    fields = tuple(fields)
+    writer, count = None, 0
+    try:
+        for table in _record_batches(pa, items, fields, row_group_size, schema):
+            if writer is None:
+                schema = table.schema
+                writer = pa.parquet.ParquetWriter(destination, schema, compression=compression)
+            writer.write_table(table, row_group_size=row_group_size)
+            count += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    api_logger.debug("Exported {} items as Parquet.".format(count))
+    return count
+
+
+def export_arrow_ipc(items, destination, fields=DEFAULT_FIELDS, batch_size=10000, schema=None):
+    """
+    Write a stream of results (e.g. an all_of generator) to an Arrow IPC file, one record batch per batch_size items.
+
+    Only one record batch is held in memory at a time. Requires pyarrow.
+    :param items: An iterable of result dictionaries (or model/lazy objects).
+    :param destination: A path or a writable binary file object.
+    :param fields: (Optional): Field names to write as columns (see project).
+                   Default: id, type, status, title, space.key, version.number, version.when.
+    :param batch_size: (Optional): The number of items per record batch. Default: 10000.
+    :param schema: (Optional): A pyarrow.Schema for the columns. Default: None, the FIELD_TYPES of known fields and
+                   strings for the others. Values of string columns that are not strings are written as JSON.
+    :return: The number of items written.
+    """
+    pa = _import_pyarrow()
+    fields = tuple(fields)
+    writer, count = None, 0
+    try:
+        for table in _record_batches(pa, items, fields, batch_size, schema):
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(destination, schema)
+            writer.write_table(table)
+            count += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    api_logger.debug("Exported {} items as Arrow IPC.".format(count))
+    return count
@@ -0,0 +1,202 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import heapq
+import itertools
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from timeit import default_timer
+
+from .api import api_logger
+from .compose import _set_result, _set_exception
+
+
+class _Scheduler(object):
+    """
+    Runs functions after a delay on a single daemon thread, so pending hedges don't each hold a timer thread.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, fn):
+        entry = [default_timer() + delay, next(self._counter), fn]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="confluence-hedge-scheduler")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                when = self._heap[0][0]
+                now = default_timer()
+                if when > now:
+                    self._condition.wait(when - now)
+                    continue
+                fn = heapq.heappop(self._heap)[2]
+            if fn is not None:
+                try:
+                    fn()
+                except Exception:
+                    api_logger.exception("Hedged request could not be sent.")
+
+
+class HedgePolicy(object):
+    def __init__(self, percentile=0.95, min_delay=0.01, window=200, min_samples=20, budget=0.05, burst=10,
+                 endpoints=None):
+        """
+        Request hedging for ConfluenceFuturesAPI. When a GET request has not answered after the given percentile of
+        the recent latencies of its end point, a duplicate request is sent and whichever answers first wins. The
+        losing request is cancelled if it has not started yet; a request already on the wire is left to finish and
+        its result is discarded.
+
+        A budget caps the extra load: every request earns budget hedge tokens (up to burst), and every hedge spends
+        one, so at most about budget * 100 percent of requests are duplicated.
+        :param percentile: (Optional): The latency percentile after which a request is hedged. Default: 0.95.
+        :param min_delay: (Optional): The minimum delay before hedging, in seconds. Default: 0.01.
+        :param window: (Optional): The number of recent latencies kept per end point. Default: 200.
+        :param min_samples: (Optional): The number of latencies an end point needs before its requests are hedged.
+                            Default: 20.
+        :param budget: (Optional): The fraction of requests that may be hedged. Default: 0.05.
+        :param burst: (Optional): The maximum number of saved up hedge tokens. Default: 10.
+        :param endpoints: (Optional): The end point templates to hedge (e.g. {"rest/api/content/{id}"}, see
+                          PythonConfluenceAPI.metrics.endpoint_template). Default: None, every GET end point.
+        """
+        assert 0 < percentile < 1, "percentile must be between 0 and 1"
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.burst = burst
+        self.endpoints = set(endpoints) if endpoints is not None else None
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+        self._scheduler = _Scheduler()
+
+    def applies_to(self, method, endpoint):
+        """
+        Check whether requests to an end point are hedged.
+        :param method: The request type as a string.
+        :param endpoint: The end point template.
+        :return: True if the request is hedged.
+        """
+        return method == "GET" and (self.endpoints is None or endpoint in self.endpoints)
+
+    def record(self, endpoint, latency):
+        """
+        Record the latency of a completed request.
+        :param endpoint: The end point template.
+        :param latency: The latency in seconds.
+        :return: None
+        """
+        with self._lock:
+            self._latencies[endpoint].append(latency)
+
+    def delay(self, endpoint):
+        """
+        The time to wait before hedging a request to an end point.
+        :param endpoint: The end point template.
+        :return: The delay in seconds, or None if there are not enough samples yet.
+        """
+        with self._lock:
+            samples = sorted(self._latencies[endpoint])
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, samples[min(len(samples) - 1, int(self.percentile * len(samples)))])
+
+    def _earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+    def _spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges_sent += 1
+            return True
+
+    def submit(self, executor, endpoint, attempt):
+        """
+        Submit a request to an executor, hedging it if it is slow.
+        :param executor: The concurrent.futures executor to send requests in.
+        :param endpoint: The end point template of the request.
+        :param attempt: A function sending the request once and returning its result; it is called once per attempt.
+        :return: A future for the result of the first attempt to succeed.
+        """
+        outer = Future()
+        # Cancelling a queued attempt runs its callbacks in the cancelling thread, which may already hold the lock.
+        lock = threading.RLock()
+        attempts = []
+        timer = [None]
+        self._earn()
+
+        def run():
+            start = default_timer()
+            result = attempt()
+            self.record(endpoint, default_timer() - start)
+            return result
+
+        def cancel_others(winner=None):
+            for other in attempts:
+                if other is not winner:
+                    other.cancel()
+            if timer[0] is not None:
+                self._scheduler.cancel(timer[0])
+
+        def on_done(future):
+            with lock:
+                if outer.done():
+                    return
+                pending = [other for other in attempts if not other.done()]
+                if future.cancelled():
+                    if not pending:
+                        outer.cancel()
+                    return
+                error = future.exception()
+                if error is None:
+                    if future is not attempts[0]:
+                        with self._lock:
+                            self.hedges_won += 1
+                    _set_result(outer, future.result())
+                    cancel_others(future)
+                elif not pending:
+                    _set_exception(outer, error)
+                    cancel_others()
+
+        def hedge():
+            with lock:
+                if outer.done() or not self._spend():
+                    return
+                api_logger.debug("Hedging slow request to {}.".format(endpoint))
+                hedged = executor.submit(run)
+                attempts.append(hedged)
+            hedged.add_done_callback(on_done)
+
+        with lock:
+            attempts.append(executor.submit(run))
+            delay = self.delay(endpoint)
+            if delay is not None:
+                timer[0] = self._scheduler.schedule(delay, hedge)
+        attempts[0].add_done_callback(on_done)
+        outer.add_done_callback(lambda f: cancel_others() if f.cancelled() else None)
+        return outer
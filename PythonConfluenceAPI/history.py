@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import difflib
+import itertools
+import re
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .api import api_logger
+from .deadline import current_deadline, within
+from .utils import resolve
+
+VersionDiff = namedtuple("VersionDiff", ["content_id", "old", "new", "diff"])
+
+# Storage format bodies are XHTML, often on a single line; diff them tag by tag.
+_TAG_BOUNDARY = re.compile(r"(?<=>)(?=<)|\n")
+
+
+def latest_version(api, content_id):
+    """
+    Look up the current version number of a piece of content.
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object.
+    :param content_id: The ID of the content.
+    :return: The latest version number.
+    """
+    history = resolve(api.get_content_history_by_id(content_id, expand="lastUpdated"))
+    return history["lastUpdated"]["number"]
+
+
+def iter_versions(api, content_id, expand="body.storage,version", first=1, last=None, max_workers=4):
+    """
+    Generator that yields every version of a piece of content, oldest first. Versions are fetched concurrently, at
+    most max_workers ahead of the consumer, so only a few versions are in memory at once. Versions are fetched with
+    version-pinned get_content_by_id calls, which are served from the immutable cache of the API object, if it has
+    one and expand only names properties that never change (see ConfluenceAPI.IMMUTABLE_EXPANSIONS).
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object.
+    :param content_id: The ID of the content.
+    :param expand: (Optional): A comma separated list of properties to expand on each version.
+                   Default: "body.storage,version".
+    :param first: (Optional): The first version number to fetch. Default: 1.
+    :param last: (Optional): The last version number to fetch. Default: None, the latest version.
+    :param max_workers: (Optional): The maximum number of versions fetched at once. Default: 4.
+    """
+    current = latest_version(api, content_id)
+    last = current if last is None else last
+    deadline = current_deadline()
+
+    def fetch(number):
+        # Only the current version is served without status=historical.
+        status = None if number == current else "historical"
+        return resolve(api.get_content_by_id(content_id, status=status, version=number, expand=expand))
+
+    api_logger.debug("Fetching versions {} to {} of {}.".format(first, last, content_id))
+    numbers = iter(range(first, last + 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(within, deadline, fetch, number)
+                        for number in itertools.islice(numbers, max_workers))
+        while pending:
+            version = pending.popleft().result()
+            number = next(numbers, None)
+            if number is not None:
+                pending.append(executor.submit(within, deadline, fetch, number))
+            yield version
+
+
+def _body_lines(version):
+    body = (version.get("body") or {}).get("storage", {}).get("value", "")
+    return [line for line in _TAG_BOUNDARY.split(body) if line]
+
+
+def diff_versions(old, new, context=3):
+    """
+    Diff the storage bodies of two versions of a piece of content.
+    :param old: The older version (as returned by get_content_by_id with body.storage expanded).
+    :param new: The newer version.
+    :param context: (Optional): The number of context lines around every change. Default: 3.
+    :return: A list of unified diff lines.
+    """
+    def label(version):
+        return "{} v{}".format(version.get("title", version.get("id")), version.get("version", {}).get("number"))
+    return list(difflib.unified_diff(_body_lines(old), _body_lines(new), label(old), label(new), n=context,
+                                     lineterm=""))
+
+
+def version_diffs(api, content_id, first=1, last=None, context=3, max_workers=4):
+    """
+    Generator that yields the diff between every pair of consecutive versions of a piece of content, oldest first.
+    Only two versions (plus the ones being prefetched) are held in memory at a time.
+
+    >>> for change in version_diffs(api, "12345"):
+    >>>     print("\\n".join(change.diff))
+
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object.
+    :param content_id: The ID of the content.
+    :param first: (Optional): The first version number to compare. Default: 1.
+    :param last: (Optional): The last version number to compare. Default: None, the latest version.
+    :param context: (Optional): The number of context lines around every change. Default: 3.
+    :param max_workers: (Optional): The maximum number of versions fetched at once. Default: 4.
+    :return: VersionDiff tuples of (content ID, older version, newer version, unified diff lines).
+    """
+    previous = None
+    for version in iter_versions(api, content_id, first=first, last=last, max_workers=max_workers):
+        if previous is not None:
+            yield VersionDiff(content_id, previous, version, diff_versions(previous, version, context))
+        previous = version
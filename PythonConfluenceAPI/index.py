@@ -0,0 +1,220 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import gzip
+import json
+import re
+import threading
+from collections import defaultdict
+from html import unescape
+
+from .api import api_logger, all_of
+from .utils import resolve
+
+INDEX_EXPAND = "body.storage,version,space,metadata.labels"
+
+_TAG = re.compile(r"<[^>]+>")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+# Positions of different fields are kept apart, so phrases never match across a field boundary.
+_FIELD_GAP = 1 << 20
+
+
+def tokenize(text):
+    """
+    Split text (plain or storage format) into lower case index terms.
+    :param text: The text.
+    :return: A list of terms.
+    """
+    return _TOKEN.findall(unescape(_TAG.sub(" ", text or "")).lower())
+
+
+def _labels(content):
+    labels = (content.get("metadata") or {}).get("labels") or content.get("labels") or {}
+    return [label.get("name", "") for label in labels.get("results", [])]
+
+
+class ContentIndex(object):
+    def __init__(self):
+        """
+        A local positional inverted index over the titles, storage bodies and labels of content, answering term and
+        phrase queries without a server round trip. Content is added with add (e.g. from results fetched with
+        expand=INDEX_EXPAND) or refreshed from the server with update, which only downloads bodies of content whose
+        version changed.
+
+        >>> index = ContentIndex()
+        >>> index.update(api, "space = TST and type = page")
+        >>> [doc["title"] for doc in index.search('"release notes" 2016')]
+
+        """
+        self.documents = {}
+        self._postings = defaultdict(dict)
+        self._terms = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, content_id):
+        return str(content_id) in self.documents
+
+    def version(self, content_id):
+        """
+        :param content_id: The ID of the content.
+        :return: The indexed version number of the content, or None if it is not indexed.
+        """
+        document = self.documents.get(str(content_id))
+        return document["version"] if document else None
+
+    def add(self, content):
+        """
+        Index a piece of content, replacing an older version of it. Content whose indexed version is the same or newer
+        is skipped.
+        :param content: The content JSON data, with body.storage, version and (optionally) metadata.labels expanded.
+        :return: True if the content was indexed.
+        """
+        content_id = str(content["id"])
+        version = (content.get("version") or {}).get("number")
+        with self._lock:
+            indexed = self.version(content_id)
+            if indexed is not None and version is not None and indexed >= version:
+                return False
+            self.remove(content_id)
+            fields = (content.get("title", ""), ((content.get("body") or {}).get("storage") or {}).get("value", ""),
+                      " ".join(_labels(content)))
+            positions = defaultdict(list)
+            for number, text in enumerate(fields):
+                for position, term in enumerate(tokenize(text)):
+                    positions[term].append(number * _FIELD_GAP + position)
+            for term, term_positions in positions.items():
+                self._postings[term][content_id] = term_positions
+            self._terms[content_id] = list(positions)
+            self.documents[content_id] = {"id": content_id, "title": content.get("title"), "version": version,
+                                          "space": (content.get("space") or {}).get("key"),
+                                          "type": content.get("type"), "labels": _labels(content)}
+            return True
+
+    def remove(self, content_id):
+        """
+        Remove a piece of content from the index.
+        :param content_id: The ID of the content.
+        :return: None
+        """
+        content_id = str(content_id)
+        with self._lock:
+            for term in self._terms.pop(content_id, ()):
+                postings = self._postings[term]
+                postings.pop(content_id, None)
+                if not postings:
+                    del self._postings[term]
+            self.documents.pop(content_id, None)
+
+    def _matches(self, phrase):
+        """
+        :return: A dictionary of content ID to the number of occurrences of the phrase.
+        """
+        postings = [self._postings.get(term, {}) for term in phrase]
+        if not all(postings):
+            return {}
+        if len(phrase) == 1:
+            return dict((content_id, len(positions)) for content_id, positions in postings[0].items())
+        candidates = set(postings[0]).intersection(*postings[1:])
+        matches = {}
+        for content_id in candidates:
+            following = [set(p[content_id]) for p in postings[1:]]
+            count = sum(1 for start in postings[0][content_id]
+                        if all(start + offset + 1 in positions for offset, positions in enumerate(following)))
+            if count:
+                matches[content_id] = count
+        return matches
+
+    def search(self, query, limit=None):
+        """
+        Find the content matching every term and quoted phrase of a query (e.g. 'deploy "release notes"'), best
+        matches (most occurrences) first.
+        :param query: The query string.
+        :param limit: (Optional): The maximum number of results. Default: None, all matches.
+        :return: A list of document summaries (id, title, version, space, type and labels).
+        """
+        clauses = [tokenize(phrase or term) for phrase, term in _QUERY.findall(query)]
+        clauses = [clause for clause in clauses if clause]
+        if not clauses:
+            return []
+        with self._lock:
+            scores = None
+            for clause in clauses:
+                matches = self._matches(clause)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = dict((content_id, score + matches[content_id]) for content_id, score in scores.items()
+                                  if content_id in matches)
+                if not scores:
+                    return []
+            ranked = sorted(scores, key=lambda content_id: (-scores[content_id], content_id))
+            return [self.documents[content_id] for content_id in ranked[:limit]]
+
+    def update(self, api, cql, batch_size=25, prune=False):
+        """
+        Bring the index up to date with the content matching a CQL query. The matching content is listed with only
+        its version expanded, and bodies are fetched (batch_size at a time) only for content that is new or changed.
+        :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object.
+        :param cql: The CQL query selecting the content to mirror.
+        :param batch_size: (Optional): The number of changed items fetched per request. Default: 25.
+        :param prune: (Optional): Remove indexed content that no longer matches the query (e.g. deleted pages).
+                      Default: False.
+        :return: The number of items (re)indexed.
+        """
+        seen = set()
+        stale = []
+        for item in all_of(api.search_content, cql, expand="version"):
+            content_id = str(item["id"])
+            seen.add(content_id)
+            indexed = self.version(content_id)
+            if indexed is None or indexed < (item.get("version") or {}).get("number", 0):
+                stale.append(content_id)
+        indexed = 0
+        for start in range(0, len(stale), batch_size):
+            chunk = stale[start:start + batch_size]
+            response = resolve(api.search_content("id in ({})".format(",".join(chunk)), expand=INDEX_EXPAND,
+                                                  limit=len(chunk)))
+            for content in (response or {}).get("results", []):
+                indexed += self.add(content)
+        if prune:
+            with self._lock:
+                for content_id in set(self.documents) - seen:
+                    self.remove(content_id)
+        api_logger.debug("Indexed {} changed items of {} matching {}.".format(indexed, len(seen), cql))
+        return indexed
+
+    def save(self, path):
+        """
+        Save the index to a file (gzip compressed if the path ends in ".gz").
+        :param path: The file to write.
+        :return: None
+        """
+        with self._lock:
+            data = {"documents": self.documents, "postings": self._postings}
+            with (gzip.open(path, "wt") if path.endswith(".gz") else open(path, "w")) as f:
+                json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save.
+        :param path: The file to read.
+        :return: A ContentIndex.
+        """
+        with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as f:
+            data = json.load(f)
+        index = cls()
+        index.documents = data["documents"]
+        terms = defaultdict(list)
+        for term, postings in data["postings"].items():
+            index._postings[term] = postings
+            for content_id in postings:
+                terms[content_id].append(term)
+        index._terms = dict(terms)
+        return index
@@ -0,0 +1,246 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+
+from .api import api_logger
+from .utils import resolve
+
+
+class LazyBatch(object):
+    def __init__(self, api, max_ids=25):
+        """
+        A group of lazy content objects whose missing expansions are fetched together. When a field that was not
+        expanded is accessed on one member, it is fetched for every member still missing it, using a single CQL
+        search per max_ids members.
+        :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object used to fetch expansions.
+        :param max_ids: (Optional): The maximum number of content IDs to request in one call. Default: 25.
+        """
+        self.api = api
+        self.max_ids = max_ids
+        self.items = []
+        self._lock = threading.RLock()
+
+    def add(self, item):
+        """
+        Add a lazy content object to this batch.
+        :param item: A LazyContent root object.
+        :return: None
+        """
+        with self._lock:
+            self.items.append(item)
+            item._batch = self
+
+    def fetch(self, requester, path):
+        """
+        Fetch the expansion at path for the requesting item and every other member of the batch that is missing it.
+        :param requester: The LazyContent root object whose access triggered the fetch.
+        :param path: A tuple of field names describing the expansion (e.g. ("body", "storage")).
+        :return: None
+        """
+        with self._lock:
+            if not requester._data.get("id"):
+                return
+            pending = [item for item in self.items
+                       if item is not requester and item._data.get("id") and item._needs(path)]
+            pending.insert(0, requester)
+            expand = ".".join(path)
+            for i in range(0, len(pending), self.max_ids):
+                chunk = pending[i:i + self.max_ids]
+                by_id = dict((item._data["id"], item) for item in chunk)
+                api_logger.debug("Lazily expanding {} for {} items.".format(expand, len(by_id)))
+                response = resolve(self.api.search_content("id in ({})".format(",".join(by_id)), expand=expand,
+                                                           limit=len(by_id)))
+                for result in (response or {}).get("results", []):
+                    item = by_id.get(result.get("id"))
+                    if item is not None:
+                        item._merge(path, result)
+                for item in chunk:
+                    item._attempted.add(path)
+            if requester._needs(path, ignore_attempts=True):
+                requester._fetch_single(path)
+
+
+class LazyContent(object):
+    # Expansions that only group further expansions (e.g. body.storage, children.page). Accessing one returns a
+    # placeholder, and the full path is fetched once a field below it is accessed.
+    CONTAINER_EXPANSIONS = frozenset([("body",), ("children",), ("descendants",), ("metadata",), ("restrictions",)])
+
+    def __init__(self, data, api, batch=None, _root=None, _path=()):
+        """
+        Wrap a content dictionary returned by the API so that fields left out of the expand parameter are fetched
+        from the server the first time they are accessed, e.g. page.body.storage.value or page.ancestors.
+
+        Fields are available as attributes or items. Nested dictionaries are returned as lazy nodes, lists of
+        dictionaries as lists of lazy content and other values as is. Unexpanded CONTAINER_EXPANSIONS are not fetched
+        by themselves, so page.body.storage costs a single body.storage request.
+        :param data: The content dictionary, as decoded from the API.
+        :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object used to fetch expansions.
+        :param batch: (Optional): A LazyBatch this object belongs to, so that misses are fetched for the whole batch.
+                      Default: None, fetch for this object alone.
+        """
+        self._data = data
+        self._api = api
+        self._batch = None
+        self._root = _root if _root is not None else self
+        self._path = _path
+        self._attempted = set()
+        if batch is not None:
+            batch.add(self)
+
+    def _node(self):
+        node = self._root._data
+        for name in self._path:
+            node = node.get(name)
+            if not isinstance(node, dict):
+                return {}
+        return node
+
+    def _exists(self):
+        node = self._root._data
+        for name in self._path:
+            node = node.get(name)
+            if not isinstance(node, dict):
+                return False
+        return True
+
+    def _expand(self, path):
+        root = self._root
+        if root._needs(path):
+            if root._batch is not None:
+                root._batch.fetch(root, path)
+            else:
+                root._fetch_single(path)
+
+    def _materialize(self):
+        if not self._exists():
+            self._expand(self._path)
+        return self._node()
+
+    def _needs(self, path, ignore_attempts=False):
+        if not ignore_attempts and path in self._attempted:
+            return False
+        node = self._data
+        for name in path[:-1]:
+            node = node.get(name)
+            if not isinstance(node, dict):
+                return True
+        return path[-1] not in node
+
+    def _merge(self, path, fetched):
+        source, target = fetched, self._data
+        for name in path[:-1]:
+            source = source.get(name) if isinstance(source, dict) else None
+            if not isinstance(target.get(name), dict):
+                # Keep the rest of a container fetched along the way, e.g. the _expandable of body.
+                target[name] = dict(source) if isinstance(source, dict) else {}
+            target = target[name]
+        if isinstance(source, dict) and path[-1] in source:
+            target[path[-1]] = source[path[-1]]
+            target.get("_expandable", {}).pop(path[-1], None)
+
+    def _fetch_single(self, path):
+        content_id = self._data.get("id")
+        if not content_id:
+            return
+        api_logger.debug("Lazily expanding {} for content {}.".format(".".join(path), content_id))
+        self._merge(path, resolve(self._api.get_content_by_id(content_id, expand=".".join(path))) or {})
+        self._attempted.add(path)
+
+    def _wrap(self, name, value):
+        if isinstance(value, dict):
+            return LazyContent(None, self._api, _root=self._root, _path=self._path + (name,))
+        elif isinstance(value, list):
+            return [LazyContent(v, self._api) if isinstance(v, dict) and "_expandable" in v else v for v in value]
+        return value
+
+    def _lookup(self, name):
+        node = self._node()
+        path = self._path + (name,)
+        if name not in node and name in node.get("_expandable", {}) and path in self.CONTAINER_EXPANSIONS:
+            return LazyContent(None, self._api, _root=self._root, _path=path)
+        if name not in node and (name in node.get("_expandable", {}) or not self._exists()):
+            self._expand(path)
+            node = self._node()
+        if name not in node:
+            raise KeyError(name)
+        return self._wrap(name, node[name])
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._lookup(name)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._lookup(name)
+
+    def __contains__(self, name):
+        node = self._materialize()
+        return name in node or name in node.get("_expandable", {})
+
+    def get(self, name, default=None):
+        """
+        Return a field, fetching it if it is expandable, or default if the content does not have it.
+        :param name: The field name.
+        :param default: (Optional): The value to return if the field is absent. Default: None.
+        :return: The (possibly lazy) field value or default.
+        """
+        try:
+            return self._lookup(name)
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """
+        Return the underlying dictionary, including every expansion fetched so far.
+        :return: The content dictionary (or the nested dictionary, for nested nodes).
+        """
+        return self._materialize()
+
+    def __repr__(self):
+        node = self._node()
+        return "<LazyContent {}>".format(" ".join("{}={!r}".format(k, node[k]) for k in ("id", "type", "title")
+                                                   if k in node) or ".".join(self._path))
+
+
+def lazy_content(data, api, batch_size=25):
+    """
+    Wrap the results of a content API call in LazyContent objects which fetch unexpanded fields on demand.
+
+    Misses are fetched for a whole batch of results at once, so touching page.body.storage on each item of a
+    listing costs one request per batch rather than one per item.
+
+    >>> for page in lazy_content(all_of(api.get_content, space_key="TST"), api):
+    >>>     print(page.title, len(page.body.storage.value))
+
+    :param data: One of: a content dictionary (e.g. from get_content_by_id), a paginated response (e.g. from
+                 get_content), a response grouped by content type (e.g. from get_space_content) or any iterable of
+                 content dictionaries (e.g. an all_of generator).
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object used to fetch expansions.
+    :param batch_size: (Optional): The number of consecutive items of an iterable that share a batch. Default: 25.
+    :return: A LazyContent for a single content dictionary, a list of LazyContent for a paginated response, a
+             dictionary of such lists for a grouped response, or a generator of LazyContent for an iterable.
+    """
+    data = resolve(data)
+    if isinstance(data, dict):
+        if isinstance(data.get("results"), list):
+            batch = LazyBatch(api)
+            return [LazyContent(item, api, batch) for item in data["results"]]
+        grouped = dict((k, v) for k, v in data.items() if isinstance(v, dict) and isinstance(v.get("results"), list))
+        if grouped:
+            batch = LazyBatch(api)
+            return dict((k, [LazyContent(item, api, batch) for item in v["results"]]) for k, v in grouped.items())
+        return LazyContent(data, api)
+    return _lazy_iter(data, api, batch_size)
+
+
+def _lazy_iter(iterable, api, batch_size):
+    batch = None
+    for i, item in enumerate(iterable):
+        if i % batch_size == 0:
+            batch = LazyBatch(api)
+        yield LazyContent(item, api, batch)
@@ -0,0 +1,201 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import bisect
+import threading
+from collections import defaultdict
+
+# Path segments that are followed by a variable part of the URI, mapped to the placeholder used in the template.
+# Top level resources (directly under rest/api) may list fixed end points that are kept as is.
+_RESOURCE_SEGMENTS = {
+    "content": ("{id}", {"search", "blueprint"}),
+    "space": ("{key}", {"_private"}),
+    "longtask": ("{id}", set()),
+}
+_TEMPLATE_SEGMENTS = {
+    "history": "{version}",
+    "hash": "{hash}",
+    "property": "{key}",
+    "byOperation": "{operation}",
+}
+
+
+def endpoint_template(sub_uri):
+    """
+    Reduce a REST sub-uri to its end point template, so that requests can be grouped per end point rather than per
+    resource, e.g. "rest/api/content/123/label" becomes "rest/api/content/{id}/label".
+    :param sub_uri: The REST end point (sub-uri) requested.
+    :return: The end point template.
+    """
+    segments = sub_uri.split("?", 1)[0].strip("/").split("/")
+    template = []
+    for i, segment in enumerate(segments):
+        previous = segments[i - 1] if i else None
+        before = segments[i - 2] if i > 1 else None
+        rule = _TEMPLATE_SEGMENTS.get(previous)
+        if before == "api" and previous in _RESOURCE_SEGMENTS:
+            placeholder, literals = _RESOURCE_SEGMENTS[previous]
+            rule = None if segment in literals else placeholder
+        elif before == "macro" and previous == "id":
+            rule = "{macro_id}"
+        elif before == "child" and previous == "attachment":
+            rule = "{attachment_id}"
+        template.append(rule or segment)
+    return "/".join(template)
+
+
+class _EndpointStats(object):
+    __slots__ = ("count", "statuses", "errors", "buckets", "latency_sum", "response_bytes", "decode_sum",
+                 "decode_count")
+
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.statuses = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.buckets = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+        self.response_bytes = 0
+        self.decode_sum = 0.0
+        self.decode_count = 0
+
+
+class RequestMetrics(object):
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, callback=None):
+        """
+        Collects per end point request metrics: request counts by status code, latency histograms, response bytes,
+        decode time, errors, retries and in-flight requests. Thread safe, so one instance may be shared between API
+        objects and worker threads.
+        :param buckets: (Optional): The upper bounds (in seconds) of the latency histogram buckets.
+                        Default: RequestMetrics.DEFAULT_BUCKETS.
+        :param callback: (Optional): A function called with a dictionary describing each finished request (keys:
+                         endpoint, method, status, latency, response_bytes, decode_time, error). Default: None.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.callback = callback
+        self._stats = {}
+        self._in_flight = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request_started(self, endpoint):
+        """
+        Record that a request to an end point has started.
+        :param endpoint: The end point template.
+        :return: None
+        """
+        with self._lock:
+            self._in_flight[endpoint] += 1
+
+    def request_finished(self, endpoint, method, status=None, latency=None, response_bytes=0, decode_time=None,
+                         error=None):
+        """
+        Record that a request to an end point has finished.
+        :param endpoint: The end point template.
+        :param method: The HTTP method (e.g. "GET").
+        :param status: (Optional): The HTTP status code, None if no response was received.
+        :param latency: (Optional): The request latency in seconds, None if no response was received.
+        :param response_bytes: (Optional): The size of the response body in bytes. Default: 0.
+        :param decode_time: (Optional): The time spent decoding the response (or running the callback) in seconds.
+        :param error: (Optional): The exception raised by the request, if any.
+        :return: None
+        """
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+            stats = self._stats.get((endpoint, method))
+            if stats is None:
+                stats = self._stats[(endpoint, method)] = _EndpointStats(len(self.buckets))
+            stats.count += 1
+            if status is not None:
+                stats.statuses[status] += 1
+            if error is not None:
+                stats.errors[type(error).__name__] += 1
+            if latency is not None:
+                stats.buckets[bisect.bisect_left(self.buckets, latency)] += 1
+                stats.latency_sum += latency
+            stats.response_bytes += response_bytes
+            if decode_time is not None:
+                stats.decode_sum += decode_time
+                stats.decode_count += 1
+        if self.callback is not None:
+            self.callback({"endpoint": endpoint, "method": method, "status": status, "latency": latency,
+                           "response_bytes": response_bytes, "decode_time": decode_time, "error": error})
+
+    def record_retry(self, endpoint):
+        """
+        Record that a request to an end point is being retried.
+        :param endpoint: The end point template.
+        :return: None
+        """
+        with self._lock:
+            self._retries[endpoint] += 1
+
+    def snapshot(self):
+        """
+        Return a copy of the collected metrics.
+        :return: A dictionary with "endpoints" (keyed by (endpoint, method)), "in_flight" and "retries" entries.
+        """
+        with self._lock:
+            endpoints = {}
+            for key, stats in self._stats.items():
+                endpoints[key] = {"count": stats.count, "statuses": dict(stats.statuses),
+                                  "errors": dict(stats.errors), "buckets": list(stats.buckets),
+                                  "latency_sum": stats.latency_sum, "response_bytes": stats.response_bytes,
+                                  "decode_sum": stats.decode_sum, "decode_count": stats.decode_count}
+            return {"endpoints": endpoints, "in_flight": dict(self._in_flight), "retries": dict(self._retries),
+                    "buckets": self.buckets}
+
+    def to_prometheus(self, prefix="confluence_api"):
+        """
+        Render the collected metrics in the Prometheus text exposition format.
+        :param prefix: (Optional): The metric name prefix. Default: "confluence_api".
+        :return: The metrics as a string.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def header(name, kind, doc):
+            lines.append("# HELP {}_{} {}".format(prefix, name, doc))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+        def sample(name, labels, value):
+            label_str = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                 for k, v in labels)
+            lines.append("{}_{}{{{}}} {}".format(prefix, name, label_str, value))
+
+        endpoints = sorted(snapshot["endpoints"].items())
+        header("requests_total", "counter", "Requests by end point, method and status code.")
+        for (endpoint, method), stats in endpoints:
+            for status, count in sorted(stats["statuses"].items()):
+                sample("requests_total", (("endpoint", endpoint), ("method", method), ("status", status)), count)
+        header("request_errors_total", "counter", "Failed requests by end point, method and exception type.")
+        for (endpoint, method), stats in endpoints:
+            for error, count in sorted(stats["errors"].items()):
+                sample("request_errors_total", (("endpoint", endpoint), ("method", method), ("error", error)), count)
+        header("request_duration_seconds", "histogram", "Request latency by end point and method.")
+        for (endpoint, method), stats in endpoints:
+            labels = (("endpoint", endpoint), ("method", method))
+            cumulative = 0
+            for bound, count in zip(snapshot["buckets"] + (float("inf"),), stats["buckets"]):
+                cumulative += count
+                sample("request_duration_seconds_bucket", labels + (("le", "+Inf" if bound == float("inf")
+                                                                                 else repr(bound)),), cumulative)
+            sample("request_duration_seconds_sum", labels, stats["latency_sum"])
+            sample("request_duration_seconds_count", labels, cumulative)
+        header("response_bytes_total", "counter", "Response body bytes by end point and method.")
+        for (endpoint, method), stats in endpoints:
+            sample("response_bytes_total", (("endpoint", endpoint), ("method", method)), stats["response_bytes"])
+        header("decode_duration_seconds", "summary", "Response decoding (and callback) time by end point and method.")
+        for (endpoint, method), stats in endpoints:
+            labels = (("endpoint", endpoint), ("method", method))
+            sample("decode_duration_seconds_sum", labels, stats["decode_sum"])
+            sample("decode_duration_seconds_count", labels, stats["decode_count"])
+        header("retries_total", "counter", "Retried requests by end point.")
+        for endpoint, count in sorted(snapshot["retries"].items()):
+            sample("retries_total", (("endpoint", endpoint),), count)
+        header("in_flight_requests", "gauge", "Requests currently in flight by end point.")
+        for endpoint, count in sorted(snapshot["in_flight"].items()):
+            sample("in_flight_requests", (("endpoint", endpoint),), count)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import requests
+
+from .metrics import endpoint_template
+
+
+class ServiceRequest(object):
+    def __init__(self, method, sub_uri, uri, kwargs, session, deadline=None):
+        """
+        A request on its way through the middleware pipeline. Middleware may modify the URI and the keyword
+        arguments (params, headers, data, timeout, ...) before the request is sent, and may keep per-request state in
+        the context dictionary.
+        :param method: The request type as a string (e.g. "POST", "GET", "PUT", etc.)
+        :param sub_uri: The REST end point (sub-uri) requested.
+        :param uri: The full URI to request.
+        :param kwargs: The keyword arguments for the session request call.
+        :param session: The requests session the request is sent through.
+        :param deadline: (Optional): The PythonConfluenceAPI.deadline.Deadline of the operation the request belongs
+                         to. Default: None.
+        """
+        self.method = method
+        self.sub_uri = sub_uri
+        self.uri = uri
+        self.kwargs = kwargs
+        self.session = session
+        self.deadline = deadline
+        self.context = {}
+        self._endpoint = None
+
+    @property
+    def endpoint(self):
+        """
+        The end point template of the request (e.g. "rest/api/content/{id}/label").
+        """
+        if self._endpoint is None:
+            self._endpoint = endpoint_template(self.sub_uri)
+        return self._endpoint
+
+    def send(self):
+        """
+        Send the request over the network, bypassing the middleware. Middleware may call this again to retry.
+        :return: The requests response object.
+        """
+        # Call the plain requests implementation, so sessions that are requests.Session subclasses with an
+        # asynchronous request method (e.g. the FuturesSession) still send synchronously in the calling thread.
+        return requests.Session.request(self.session, self.method, self.uri, **self.kwargs)
+
+
+class RequestMiddleware(object):
+    """
+    Base class for request middleware. Middleware is run in order around every request made through
+    _service_request, for both ConfluenceAPI and ConfluenceFuturesAPI (where it runs in the worker thread):
+
+        - before_request is called in order before the request is sent. Returning a response short-circuits the
+          request; later middleware and the network are skipped.
+        - after_response is called in reverse order with the response, and returns the (possibly replaced) response.
+        - on_error is called in reverse order if sending (or another stage) raised. Returning a response recovers from
+          the error; returning None lets the exception propagate.
+
+    Only middleware whose before_request ran takes part in the later stages of a request.
+    """
+
+    def before_request(self, request):
+        """
+        Pre-request stage.
+        :param request: The ServiceRequest.
+        :return: None to continue, or a requests response object to short-circuit the request.
+        """
+        return None
+
+    def after_response(self, request, response):
+        """
+        Post-response stage.
+        :param request: The ServiceRequest.
+        :param response: The requests response object.
+        :return: The response to pass on.
+        """
+        return response
+
+    def on_error(self, request, error):
+        """
+        Error stage.
+        :param request: The ServiceRequest.
+        :param error: The exception raised.
+        :return: None to re-raise the error, or a requests response object to recover with.
+        """
+        return None
+
+
+def run_middleware(middleware, request):
+    """
+    Send a request through a middleware chain.
+    :param middleware: A sequence of RequestMiddleware objects.
+    :param request: The ServiceRequest to send.
+    :return: The requests response object.
+    """
+    entered = []
+    try:
+        response = None
+        for layer in middleware:
+            entered.append(layer)
+            response = layer.before_request(request)
+            if response is not None:
+                break
+        if response is None:
+            response = request.send()
+        for layer in reversed(entered):
+            response = layer.after_response(request, response)
+        return response
+    except Exception as error:
+        for layer in reversed(entered):
+            response = layer.on_error(request, error)
+            if response is not None:
+                return response
+        raise
@@ -0,0 +1,281 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+from sys import intern
+
+try:
+    import anyjson as json
+except ImportError:
+    import json
+
+
+def _text(factory, value):
+    return factory.intern(value) if value is not None else None
+
+
+class _Model(object):
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        # Models are immutable once built, since they hash by value; every slot may only be set once, in __init__.
+        if hasattr(self, name):
+            raise AttributeError("{} objects are immutable".format(type(self).__name__))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError("{} objects are immutable".format(type(self).__name__))
+
+    def to_dict(self):
+        """
+        Convert the model back into a (flat) dictionary.
+        :return: A dictionary of the model fields; nested models are converted recursively.
+        """
+        result = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, _Model):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = [v.to_dict() if isinstance(v, _Model) else v for v in value]
+            result[name] = value
+        return result
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # Hash the fields __eq__ compares, so equal models collapse in sets and dictionaries.
+        return hash((type(self),) + tuple(getattr(self, n) for n in self.__slots__))
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__,
+                               ", ".join("{}={!r}".format(n, getattr(self, n)) for n in self.__slots__[:3]))
+
+
+class Space(_Model):
+    __slots__ = ("key", "id", "name", "type")
+
+    def __init__(self, key, id=None, name=None, type=None):
+        self.key = key
+        self.id = id
+        self.name = name
+        self.type = type
+
+    @classmethod
+    def from_json(cls, data, factory=None):
+        """
+        Build a Space from its JSON representation. Spaces are shared per factory, so every content item of a space
+        references the same object.
+        :param data: The space dictionary, as decoded from the API.
+        :param factory: (Optional): The ModelFactory used to intern strings and share spaces. Default: a new one.
+        :return: The Space object.
+        """
+        factory = factory or ModelFactory()
+        return factory.space(data)
+
+
+class Version(_Model):
+    __slots__ = ("number", "when", "by", "message", "minor_edit")
+
+    def __init__(self, number, when=None, by=None, message=None, minor_edit=False):
+        self.number = number
+        self.when = when
+        self.by = by
+        self.message = message
+        self.minor_edit = minor_edit
+
+    @classmethod
+    def from_json(cls, data, factory=None):
+        """
+        Build a Version from its JSON representation.
+        :param data: The version dictionary, as decoded from the API.
+        :param factory: (Optional): The ModelFactory used to intern strings. Default: a new one.
+        :return: The Version object.
+        """
+        factory = factory or ModelFactory()
+        by = data.get("by") or {}
+        return cls(data.get("number"), data.get("when"), _text(factory, by.get("username") or by.get("accountId")),
+                   data.get("message") or None, bool(data.get("minorEdit", False)))
+
+
+class Label(_Model):
+    __slots__ = ("name", "prefix", "id")
+
+    def __init__(self, name, prefix=None, id=None):
+        self.name = name
+        self.prefix = prefix
+        self.id = id
+
+    @classmethod
+    def from_json(cls, data, factory=None):
+        """
+        Build a Label from its JSON representation.
+        :param data: The label dictionary, as decoded from the API.
+        :param factory: (Optional): The ModelFactory used to intern strings. Default: a new one.
+        :return: The Label object.
+        """
+        factory = factory or ModelFactory()
+        return cls(_text(factory, data.get("name")), _text(factory, data.get("prefix")), data.get("id"))
+
+
+class Content(_Model):
+    __slots__ = ("id", "type", "title", "status", "space", "version", "body", "labels", "ancestors", "webui")
+
+    def __init__(self, id, type, title, status=None, space=None, version=None, body=None, labels=(), ancestors=(),
+                 webui=None):
+        self.id = id
+        self.type = type
+        self.title = title
+        self.status = status
+        self.space = space
+        self.version = version
+        self.body = body
+        self.labels = labels
+        self.ancestors = ancestors
+        self.webui = webui
+
+    @classmethod
+    def from_json(cls, data, factory=None):
+        """
+        Build a Content object from its JSON representation. Only the storage body is kept, labels are read from the
+        metadata.labels expansion and ancestors are reduced to a tuple of content IDs.
+        :param data: The content dictionary, as decoded from the API.
+        :param factory: (Optional): The ModelFactory used to intern strings and share spaces. Default: a new one.
+        :return: The Content object.
+        """
+        factory = factory or ModelFactory()
+        space, version = data.get("space"), data.get("version")
+        body = (data.get("body") or {}).get("storage", {}).get("value")
+        labels = ((data.get("metadata") or {}).get("labels") or {}).get("results", ())
+        return cls(data.get("id"), _text(factory, data.get("type")), data.get("title"),
+                   _text(factory, data.get("status")),
+                   factory.space(space) if space else None,
+                   Version.from_json(version, factory) if version else None,
+                   body,
+                   tuple(Label.from_json(l, factory) for l in labels),
+                   tuple(a.get("id") for a in data.get("ancestors", ())),
+                   (data.get("_links") or {}).get("webui"))
+
+
+class Attachment(_Model):
+    __slots__ = ("id", "title", "status", "media_type", "file_size", "comment", "download", "container_id",
+                 "version")
+
+    def __init__(self, id, title, status=None, media_type=None, file_size=None, comment=None, download=None,
+                 container_id=None, version=None):
+        self.id = id
+        self.title = title
+        self.status = status
+        self.media_type = media_type
+        self.file_size = file_size
+        self.comment = comment
+        self.download = download
+        self.container_id = container_id
+        self.version = version
+
+    @classmethod
+    def from_json(cls, data, factory=None):
+        """
+        Build an Attachment from its JSON representation.
+        :param data: The attachment dictionary, as decoded from the API.
+        :param factory: (Optional): The ModelFactory used to intern strings. Default: a new one.
+        :return: The Attachment object.
+        """
+        factory = factory or ModelFactory()
+        metadata, extensions, version = data.get("metadata") or {}, data.get("extensions") or {}, data.get("version")
+        container = data.get("container") or {}
+        return cls(data.get("id"), data.get("title"), _text(factory, data.get("status")),
+                   _text(factory, metadata.get("mediaType") or extensions.get("mediaType")),
+                   extensions.get("fileSize"), metadata.get("comment") or extensions.get("comment"),
+                   (data.get("_links") or {}).get("download"), container.get("id"),
+                   Version.from_json(version, factory) if version else None)
+
+
+class ModelFactory(object):
+    def __init__(self):
+        """
+        Builds model objects from API results, interning repeated strings (space keys, types, statuses, user names)
+        and sharing one Space object per space key across every object it builds.
+        """
+        self._spaces = {}
+        self._lock = threading.Lock()
+
+    def intern(self, value):
+        """
+        Intern a repeated string value.
+        :param value: The string.
+        :return: The interned string.
+        """
+        return intern(value) if isinstance(value, str) else value
+
+    def space(self, data):
+        """
+        Return the shared Space for a space dictionary, creating it on first sight.
+        :param data: The space dictionary, as decoded from the API.
+        :return: The shared Space object.
+        """
+        key = self.intern(data.get("key"))
+        space = self._spaces.get(key)
+        if space is None:
+            with self._lock:
+                space = self._spaces.get(key)
+                if space is None:
+                    space = Space(key, data.get("id"), data.get("name"), self.intern(data.get("type") or ""))
+                    self._spaces[key] = space
+        return space
+
+    def build(self, data, model=None):
+        """
+        Build a model object from a result dictionary.
+        :param data: The result dictionary, as decoded from the API.
+        :param model: (Optional): The model class to build. Default: None, picked from the shape of the data
+                      (attachments, labels, spaces, versions, and content otherwise).
+        :return: The model object.
+        """
+        if model is None:
+            if data.get("type") == "attachment":
+                model = Attachment
+            elif "prefix" in data and "name" in data:
+                model = Label
+            elif "key" in data and "title" not in data:
+                model = Space
+            elif "number" in data and "title" not in data:
+                model = Version
+            else:
+                model = Content
+        return model.from_json(data, self)
+
+    def build_all(self, data, model=None):
+        """
+        Build model objects from an API response.
+        :param data: A single result dictionary or a paginated response with a "results" list.
+        :param model: (Optional): The model class to build. Default: None, picked from the shape of the data.
+        :return: A list of model objects for a paginated response, otherwise a single model object.
+        """
+        if isinstance(data.get("results"), list):
+            return [self.build(item, model) for item in data["results"]]
+        return self.build(data, model)
+
+
+def model_callback(model=None, factory=None):
+    """
+    Create a callback for the API methods' callback= parameter that returns model objects instead of dictionaries.
+
+    >>> pages = api.get_content(space_key="TST", callback=model_callback(Content))
+
+    :param model: (Optional): The model class to build. Default: None, picked from the shape of the data.
+    :param factory: (Optional): The ModelFactory to share between calls. Default: a new factory for each callback.
+    :return: The callback function.
+    """
+    factory = factory or ModelFactory()
+
+    def callback(response):
+        if not response.text:
+            return None
+        return factory.build_all(json.loads(response.text), model)
+    return callback
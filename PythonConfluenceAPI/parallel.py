@@ -0,0 +1,211 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import datetime
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .api import api_logger, all_of
+from .deadline import current_deadline, within
+from .utils import resolve
+
+DEFAULT_SHARD_TYPES = ("page", "blogpost", "comment", "attachment")
+# get_spaces lists current spaces only, but archived spaces still hold content.
+SPACE_STATUSES = ("current", "archived")
+
+
+class _Cursor(object):
+    def __init__(self, label, api_call, args, kwargs, group=None):
+        """
+        One paginated listing, fetched a page at a time.
+        :param label: A label for the cursor (e.g. the shard query), used in log messages.
+        :param api_call: The Confluence API call (method) to page through.
+        :param args: Positional arguments of the call.
+        :param kwargs: Keyword arguments of the call.
+        :param group: (Optional): The fairness group of the cursor (e.g. its space key). Default: None, the label.
+        """
+        self.label = label
+        self.group = label if group is None else group
+        self.api_call = api_call
+        self.args = args
+        self.kwargs = dict(kwargs)
+
+    def fetch(self):
+        return resolve(self.api_call(*self.args, **self.kwargs)) or {}
+
+    def advance(self, page):
+        """
+        Move the cursor past a fetched page.
+        :param page: The page returned by fetch.
+        :return: True if there are more pages.
+        """
+        if not page.get('_links', {}).get('next') or not page.get('size'):
+            return False
+        self.kwargs['start'] = page['start'] + page['size']
+        self.kwargs['limit'] = page['limit']
+        return True
+
+
+def _run_cursors(cursors, max_workers, max_per_group=None):
+    """
+    Fetch several paginated listings concurrently, yielding (cursor, item) pairs as pages arrive. Each cursor has at
+    most one page in flight and cursor groups are served in turn (with at most max_per_group pages in flight each), so
+    a long listing cannot starve the others; new pages are only requested as the consumer catches up, which bounds
+    memory. The deadline of the caller, if any, carries over to the worker threads.
+    """
+    deadline = current_deadline()
+    ready = OrderedDict()
+    for cursor in cursors:
+        ready.setdefault(cursor.group, deque()).append(cursor)
+    active = defaultdict(int)
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit_next():
+        for group in list(ready):
+            if ready[group] and (max_per_group is None or active[group] < max_per_group):
+                cursor = ready[group].popleft()
+                active[group] += 1
+                in_flight[executor.submit(within, deadline, cursor.fetch)] = cursor
+                # Served groups go to the back of the line.
+                ready.move_to_end(group)
+                return True
+        return False
+
+    try:
+        while True:
+            while len(in_flight) < max_workers and submit_next():
+                pass
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                cursor = in_flight.pop(future)
+                active[cursor.group] -= 1
+                page = future.result()
+                if cursor.advance(page):
+                    ready[cursor.group].append(cursor)
+                else:
+                    api_logger.debug("Finished listing {}.".format(cursor.label))
+                for item in page.get('results', []):
+                    yield cursor, item
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _cql_date(value):
+    if isinstance(value, datetime.datetime):
+        return '"{}"'.format(value.strftime("%Y/%m/%d %H:%M"))
+    if isinstance(value, datetime.date):
+        return '"{}"'.format(value.strftime("%Y-%m-%d"))
+    return '"{}"'.format(value)
+
+
+def _space_keys(api):
+    return [space["key"] for status in SPACE_STATUSES for space in all_of(api.get_spaces, status=status)]
+
+
+def shard_queries(cql, by, shards, remainder=False):
+    """
+    Split a CQL query into disjoint sub-queries.
+    :param cql: The CQL query string.
+    :param by: The field to shard on: "space", "type", "created" or "lastModified".
+    :param shards: For "space" and "type", the space keys or content types, one sub-query each. For "created" and
+                   "lastModified", the sorted boundaries (dates, datetimes or CQL date strings) between date ranges;
+                   n boundaries give n + 1 sub-queries covering all dates.
+    :param remainder: (Optional): For "space" and "type", add a sub-query for every other value (NOT IN the shards),
+                      so the sub-queries cover the whole query. Default: False.
+    :return: A list of CQL query strings.
+    """
+    assert by in ("space", "type", "created", "lastModified"), "Unknown shard field {}".format(by)
+    if by in ("space", "type"):
+        queries = ['({}) AND {} = "{}"'.format(cql, by, value) for value in shards]
+        if remainder:
+            queries.append('({}) AND {} NOT IN ({})'.format(cql, by, ",".join('"{}"'.format(v) for v in shards)))
+        return queries
+    bounds = [_cql_date(value) for value in shards]
+    assert bounds, "At least one date boundary is required to shard on {}".format(by)
+    queries = ['({}) AND {} < {}'.format(cql, by, bounds[0])]
+    for lower, upper in zip(bounds, bounds[1:]):
+        queries.append('({}) AND {} >= {} AND {} < {}'.format(cql, by, lower, by, upper))
+    queries.append('({}) AND {} >= {}'.format(cql, by, bounds[-1]))
+    return queries
+
+
+def sharded_search(api, cql, by="space", shards=None, expand=None, page_limit=None, max_workers=8,
+                   deduplicate=None):
+    """
+    Generator that runs a CQL search as several disjoint sub-queries concurrently and yields their results as one
+    stream, in no particular order. Splitting a very large search keeps every cursor shallow and makes the total time
+    depend on the slowest shard rather than on the size of the whole result set.
+
+    >>> for item in sharded_search(api, 'type = page AND label = "audit"', by="space"):
+    >>>     print(item["id"], item["title"])
+
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object to search with.
+    :param cql: The CQL query string.
+    :param by: (Optional): The field to shard on: "space", "type", "created" or "lastModified". Default: "space".
+    :param shards: (Optional): The shard values, see shard_queries. Default: all current and archived spaces (listed
+                   with get_spaces) when sharding by space, or DEFAULT_SHARD_TYPES plus one shard for every other type
+                   when sharding by type; required for dates. Explicit space or type shards only cover the listed
+                   values.
+    :param expand: (Optional): A comma separated list of properties to expand on the results. Default: None.
+    :param page_limit: (Optional): The page size to request from each shard. Default: None, the server default.
+    :param max_workers: (Optional): The maximum number of requests in flight. Default: 8.
+    :param deduplicate: (Optional): Skip results already yielded, e.g. content whose last modification moved it
+                        between date shards during the search. The IDs of all results are kept in memory to do so.
+                        Default: None, only when sharding by date; space and type shards are disjoint.
+    """
+    remainder = False
+    if deduplicate is None:
+        deduplicate = by in ("created", "lastModified")
+    if shards is None:
+        if by == "space":
+            shards = _space_keys(api)
+        elif by == "type":
+            shards, remainder = DEFAULT_SHARD_TYPES, True
+    cursors = [_Cursor(query, api.search_content, (query,), {"expand": expand, "limit": page_limit})
+               for query in shard_queries(cql, by, shards, remainder)]
+    api_logger.debug("Searching {} shards of {}.".format(len(cursors), cql))
+    seen = set()
+    for _, item in _run_cursors(cursors, max_workers):
+        if deduplicate:
+            content_id = item.get("id")
+            if content_id in seen:
+                continue
+            seen.add(content_id)
+        yield item
+
+
+def crawl_spaces(api, space_keys=None, content_types=("page", "blogpost"), depth=None, expand=None, page_limit=None,
+                 max_workers=8, max_per_space=1):
+    """
+    Generator that crawls the content of many spaces concurrently, yielding (space key, content) pairs as one stream.
+    The number of requests in flight is capped globally by max_workers and per space by max_per_space, and spaces are
+    served in turn, so one huge space cannot starve the others.
+
+    >>> for space_key, page in crawl_spaces(api, content_types=("page",), expand="version"):
+    >>>     print(space_key, page["title"], page["version"]["number"])
+
+    :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object to crawl with.
+    :param space_keys: (Optional): The keys of the spaces to crawl. Default: None, all current and archived spaces
+                       (listed with get_spaces).
+    :param content_types: (Optional): The content types to list in each space. Default: ("page", "blogpost").
+    :param depth: (Optional): The depth of the content to list ("all" or "root"). Default: None, the server default.
+    :param expand: (Optional): A comma separated list of properties to expand on the content. Default: None.
+    :param page_limit: (Optional): The page size to request. Default: None, the server default.
+    :param max_workers: (Optional): The maximum number of requests in flight. Default: 8.
+    :param max_per_space: (Optional): The maximum number of requests in flight per space. Default: 1.
+    """
+    if space_keys is None:
+        space_keys = _space_keys(api)
+    cursors = [_Cursor("{}/{}".format(space_key, content_type), api.get_space_content_by_type,
+                       (space_key, content_type), {"depth": depth, "expand": expand, "limit": page_limit},
+                       group=space_key)
+               for space_key in space_keys for content_type in content_types]
+    api_logger.debug("Crawling {} spaces.".format(len(space_keys)))
+    for cursor, item in _run_cursors(cursors, max_workers, max_per_space):
+        yield cursor.group, item
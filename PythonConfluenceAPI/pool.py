@@ -0,0 +1,207 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Executor, Future
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from .api import api_logger
+from .cfapi import ConfluenceFuturesAPI
+
+
+class FairExecutor(object):
+    def __init__(self, max_workers=32, max_per_tenant=None, thread_name_prefix="confluence-pool"):
+        """
+        A bounded thread pool shared by several tenants. Every tenant has its own queue and the worker threads take
+        work from the tenants in turn, so a tenant with a deep backlog delays the others by at most one task per
+        round. Use tenant() to get a concurrent.futures executor for one tenant.
+        :param max_workers: (Optional): The maximum number of worker threads. Default: 32.
+        :param max_per_tenant: (Optional): The maximum number of tasks of one tenant running at once. Default: None,
+                               no limit beyond max_workers.
+        :param thread_name_prefix: (Optional): The name prefix of the worker threads. Default: "confluence-pool".
+        """
+        self.max_workers = max_workers
+        self.max_per_tenant = max_per_tenant
+        self.thread_name_prefix = thread_name_prefix
+        self._queues = OrderedDict()
+        self._running = defaultdict(int)
+        self._condition = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._queued = 0
+        self._shutdown = False
+
+    def tenant(self, key):
+        """
+        Get an executor submitting to this pool on behalf of a tenant.
+        :param key: The tenant key.
+        :return: A concurrent.futures.Executor.
+        """
+        return _TenantExecutor(self, key)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Queue a task for a tenant.
+        :param key: The tenant key.
+        :param fn: The function to call.
+        :return: A concurrent.futures.Future for the result of fn.
+        """
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queues.setdefault(key, deque()).append((future, fn, args, kwargs))
+            self._queued += 1
+            # A notified worker counts as idle until it wakes up and claims a task, so compare against the tasks
+            # that are still unclaimed; a burst of submissions must not all wait for the same idle worker.
+            if self._queued > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, name="{}-{}".format(self.thread_name_prefix,
+                                                                                  len(self._threads)))
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return future
+
+    def _next(self):
+        for key in list(self._queues):
+            if self.max_per_tenant is not None and self._running[key] >= self.max_per_tenant:
+                continue
+            queue = self._queues.pop(key)
+            item = queue.popleft()
+            # The tenant goes to the back of the line, and leaves it once its queue is empty.
+            if queue:
+                self._queues[key] = queue
+            self._running[key] += 1
+            self._queued -= 1
+            return key, item
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                task = self._next()
+                while task is None:
+                    if self._shutdown and not self._queues:
+                        return
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                    task = self._next()
+            key, (future, fn, args, kwargs) = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running[key] -= 1
+                    if self.max_per_tenant is not None:
+                        self._condition.notify()
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting tasks; queued tasks still run.
+        :param wait: (Optional): Wait for the queued tasks to finish. Default: True.
+        :return: None
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
+
+
+class _TenantExecutor(Executor):
+    def __init__(self, pool, key):
+        self.pool = pool
+        self.key = key
+
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submit(self.key, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, **kwargs):
+        # The pool is shared with other tenants; it is shut down through its owner.
+        pass
+
+
+class ClientPool(object):
+    def __init__(self, max_workers=32, max_per_tenant=None, pool_maxsize=10, **api_kwargs):
+        """
+        A registry of ConfluenceFuturesAPI objects for many Confluence sites and credentials. All clients share one
+        bounded FairExecutor, scheduled fairly between clients, and all clients of a site share one connection pool,
+        so thread and socket counts stay fixed however many tenants there are.
+
+        >>> pool = ClientPool(max_workers=64)
+        >>> api = pool.get("https://wiki.example.com/", "bot", "secret")
+
+        :param max_workers: (Optional): The number of worker threads shared by all clients. Default: 32.
+        :param max_per_tenant: (Optional): The maximum number of requests of one client in flight at once.
+                               Default: None, no limit beyond max_workers.
+        :param pool_maxsize: (Optional): The number of connections kept open per site. Default: 10.
+        :param api_kwargs: Further keyword arguments for every ConfluenceFuturesAPI (e.g. metrics, middleware).
+        """
+        self.executor = FairExecutor(max_workers, max_per_tenant)
+        self.pool_maxsize = pool_maxsize
+        self.api_kwargs = api_kwargs
+        self._clients = {}
+        self._adapters = {}
+        self._lock = threading.Lock()
+
+    def _adapter(self, uri_base):
+        parts = urlsplit(uri_base)
+        key = (parts.scheme, parts.netloc)
+        adapter = self._adapters.get(key)
+        if adapter is None:
+            adapter = self._adapters[key] = HTTPAdapter(pool_maxsize=self.pool_maxsize)
+        return adapter
+
+    def get(self, uri_base, username, password, **kwargs):
+        """
+        Get the client for a site and credentials, creating it on first use.
+        :param uri_base: The base url of the Confluence wiki.
+        :param username: The Confluence username.
+        :param password: The Confluence password.
+        :param kwargs: Keyword arguments for a new client, overriding those given to the pool. Ignored if the client
+                       already exists.
+        :return: A ConfluenceFuturesAPI object.
+        """
+        key = (uri_base.rstrip("/"), username, password)
+        with self._lock:
+            api = self._clients.get(key)
+            if api is None:
+                api_logger.debug("Adding pooled client for {} ({}).".format(uri_base, username))
+                options = dict(self.api_kwargs, **kwargs)
+                api = ConfluenceFuturesAPI(username, password, uri_base,
+                                           executor=self.executor.tenant((key[0], username)),
+                                           http_adapter=self._adapter(uri_base), **options)
+                self._clients[key] = api
+            return api
+
+    def shutdown(self, wait=True):
+        """
+        Shut down the shared executor and close all connections.
+        :param wait: (Optional): Wait for queued requests to finish. Default: True.
+        :return: None
+        """
+        self.executor.shutdown(wait)
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+            self._clients.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
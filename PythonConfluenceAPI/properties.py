@@ -0,0 +1,156 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+from collections.abc import MutableMapping
+
+import requests
+
+from .api import api_logger, all_of
+from .utils import resolve
+
+_DELETED = object()
+
+
+class PropertyStore(MutableMapping):
+    def __init__(self, api, content_id, write_behind=True, max_retries=3):
+        """
+        A dictionary view of the content properties of a piece of content. All properties are read with one
+        (paginated) get_content_properties call on first access and cached. Writes are buffered until flush (or the
+        end of a with block) when write_behind is set, so repeated writes to a key cost a single request; version
+        numbers are tracked automatically, and a write that conflicts with a concurrent change (409) is retried on
+        top of the current version.
+
+        >>> with PropertyStore(api, "12345") as props:
+        >>>     props["build"] = {"number": props.get("build", {}).get("number", 0) + 1}
+
+        :param api: The ConfluenceAPI (or ConfluenceFuturesAPI) object.
+        :param content_id: The ID of the content holding the properties.
+        :param write_behind: (Optional): Buffer writes until flush. Default: True; False writes through immediately.
+        :param max_retries: (Optional): The number of times a conflicting write is retried. Default: 3.
+        """
+        self.api = api
+        self.content_id = content_id
+        self.write_behind = write_behind
+        self.max_retries = max_retries
+        self._values = None
+        self._versions = {}
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._values is None:
+            with self._lock:
+                if self._values is None:
+                    self.refresh()
+        return self._values
+
+    def refresh(self):
+        """
+        Re-read all properties from the server. Buffered writes are kept.
+        :return: None
+        """
+        values, versions = {}, {}
+        for prop in all_of(self.api.get_content_properties, self.content_id, expand="version"):
+            values[prop["key"]] = prop["value"]
+            versions[prop["key"]] = prop["version"]["number"]
+        with self._lock:
+            self._values, self._versions = values, versions
+        api_logger.debug("Loaded {} properties of {}.".format(len(values), self.content_id))
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._pending:
+                value = self._pending[key]
+                if value is _DELETED:
+                    raise KeyError(key)
+                return value
+            return self._load()[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._load()
+            self._pending[key] = value
+            if not self.write_behind:
+                self.flush()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key not in self:
+                raise KeyError(key)
+            self._pending[key] = _DELETED
+            if not self.write_behind:
+                self.flush()
+
+    def _keys(self):
+        keys = set(self._load())
+        for key, value in self._pending.items():
+            if value is _DELETED:
+                keys.discard(key)
+            else:
+                keys.add(key)
+        return keys
+
+    def __iter__(self):
+        with self._lock:
+            return iter(sorted(self._keys()))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys())
+
+    def _write(self, key, value):
+        for attempt in range(self.max_retries + 1):
+            version = self._versions.get(key, 0) + 1
+            try:
+                result = resolve(self.api.update_property(self.content_id, key, {
+                    "key": key, "value": value, "version": {"number": version, "minorEdit": True}}))
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 409 or attempt == self.max_retries:
+                    raise
+                api_logger.debug("Property {} of {} changed concurrently, retrying.".format(key, self.content_id))
+                try:
+                    current = resolve(self.api.get_content_property_by_key(self.content_id, key, expand="version"))
+                    self._versions[key] = current["version"]["number"]
+                except requests.HTTPError as missing:
+                    if missing.response is None or missing.response.status_code != 404:
+                        raise
+                    self._versions.pop(key, None)
+                continue
+            self._versions[key] = ((result or {}).get("version") or {}).get("number", version)
+            self._values[key] = value
+            return
+
+    def _delete(self, key):
+        try:
+            resolve(self.api.delete_property(self.content_id, key))
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+        self._values.pop(key, None)
+        self._versions.pop(key, None)
+
+    def flush(self):
+        """
+        Write the buffered changes to the server, one request per changed key.
+        :return: The number of keys written.
+        """
+        with self._lock:
+            written = 0
+            while self._pending:
+                key, value = next(iter(self._pending.items()))
+                if value is _DELETED:
+                    self._delete(key)
+                else:
+                    self._write(key, value)
+                del self._pending[key]
+                written += 1
+            return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.flush()
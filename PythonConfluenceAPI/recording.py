@@ -0,0 +1,143 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .api import api_logger
+from .middleware import RequestMiddleware
+
+# Response headers worth keeping in a cassette; everything else is dropped to keep cassettes compact.
+RECORDED_HEADERS = ("Content-Type", "Retry-After", "Location", "X-RateLimit-Remaining", "X-RateLimit-Limit")
+
+
+class CassetteMissError(requests.ConnectionError):
+    """
+    Raised when replaying a cassette and a request has no recorded exchange.
+    """
+
+
+def _request_key(method, uri, params, data):
+    parts = urlsplit(uri)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if isinstance(params, dict):
+        query.extend(params.items())
+    elif params:
+        query.extend(params)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = hashlib.sha1(data).hexdigest() if isinstance(data, bytes) and data else ""
+    return "{} {}?{} {}".format(method.upper(), parts.path, urlencode(sorted((str(k), str(v)) for k, v in query)),
+                                digest)
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode)
+
+
+class RecordingMiddleware(RequestMiddleware):
+    def __init__(self, path):
+        """
+        Middleware that records every request/response exchange to a cassette file: one compact JSON line per
+        exchange, gzip compressed if the path ends in ".gz". Add it last in the middleware chain so it records what
+        actually went over the network.
+        :param path: The cassette file to write. An existing file is overwritten.
+        """
+        self.path = path
+        self._file = _open(path, "w")
+        self._lock = threading.Lock()
+
+    def before_request(self, request):
+        request.context["recording_start"] = time.time()
+        return None
+
+    def after_response(self, request, response):
+        elapsed = time.time() - request.context.get("recording_start", time.time())
+        content = response.content or b""
+        try:
+            body, encoding = content.decode('utf-8'), None
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode('ascii'), "base64"
+        entry = {"key": _request_key(request.method, request.uri, request.kwargs.get("params"),
+                                     request.kwargs.get("data")),
+                 "status": response.status_code, "reason": response.reason,
+                 "headers": dict((h, response.headers[h]) for h in RECORDED_HEADERS if h in response.headers),
+                 "body": body, "elapsed": round(elapsed, 6)}
+        if encoding:
+            entry["encoding"] = encoding
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+        return response
+
+    def close(self):
+        """
+        Close the cassette file.
+        :return: None
+        """
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayMiddleware(RequestMiddleware):
+    def __init__(self, path, reproduce_latency=False, latency_scale=1.0):
+        """
+        Middleware that answers every request from a cassette written by RecordingMiddleware, never touching the
+        network. Requests are matched on method, path, query parameters and body, not on the host, so a cassette
+        recorded against one site can be replayed with any uri_base. Identical requests are answered with their
+        recorded responses in order; once those run out, the last one is repeated. Requests that were never recorded
+        raise CassetteMissError.
+        :param path: The cassette file to read.
+        :param reproduce_latency: (Optional): Sleep for the recorded latency of each exchange before answering.
+                                  Default: False.
+        :param latency_scale: (Optional): A factor applied to reproduced latencies. Default: 1.0.
+        """
+        self.path = path
+        self.reproduce_latency = reproduce_latency
+        self.latency_scale = latency_scale
+        self._entries = defaultdict(deque)
+        self._lock = threading.Lock()
+        with _open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        api_logger.debug("Loaded {} recorded end points from {}.".format(len(self._entries), path))
+
+    def before_request(self, request):
+        key = _request_key(request.method, request.uri, request.kwargs.get("params"), request.kwargs.get("data"))
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError("No recorded exchange for {}".format(key))
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.reproduce_latency and entry["elapsed"]:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        body = entry["body"]
+        response._content = base64.b64decode(body) if entry.get("encoding") == "base64" else body.encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.uri
+        response.elapsed = timedelta(seconds=entry["elapsed"])
+        return response
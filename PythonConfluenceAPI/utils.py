@@ -0,0 +1,16 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+
+def resolve(value):
+    """
+    Return the result of an API call, waiting on it first if it was made through an asynchronous API (e.g.
+    ConfluenceFuturesAPI returns concurrent.futures objects), so helpers can accept either API flavour.
+    :param value: The value returned by an API method.
+    :return: The value itself, or the result of the future.
+    """
+    result = getattr(value, 'result', None)
+    if callable(result) and hasattr(value, 'add_done_callback'):
+        return result()
+    return value
@@ -0,0 +1,192 @@
+"""
+A small stand-in Confluence REST server for benchmarking PythonConfluenceAPI without a real wiki.
+
+The server answers the content, search, space and child end points with generated data, and can be configured with
+a response latency, the server side page size limit, the size of page bodies and a rate of 429 (throttled) answers.
+"""
+__author__ = 'Robert Cope'
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class FakeConfluenceServer(object):
+    ITEM_RE = re.compile(r"^/rest/api/content/(\d+)$")
+
+    def __init__(self, latency=0.0, jitter=0.0, max_limit=100, total_items=1000, body_size=0,
+                 throttle_rate=0.0, spaces=10, host="127.0.0.1", port=0, seed=0):
+        """
+        Configure a fake Confluence server.
+        :param latency: (Optional): The base latency of every response, in seconds. Default: 0.
+        :param jitter: (Optional): Extra latency drawn uniformly from [0, jitter] seconds. Default: 0.
+        :param max_limit: (Optional): The server side page size limit; larger limits are clamped. Default: 100.
+        :param total_items: (Optional): The number of items in every collection. Default: 1000.
+        :param body_size: (Optional): The size in bytes of the storage body of each item when body is expanded.
+                          Default: 0.
+        :param throttle_rate: (Optional): The fraction of requests answered with 429 Too Many Requests. Default: 0.
+        :param spaces: (Optional): The number of spaces. Default: 10.
+        :param host: (Optional): The interface to listen on. Default: 127.0.0.1.
+        :param port: (Optional): The port to listen on. Default: 0, pick a free port.
+        :param seed: (Optional): The random seed for jitter and throttling. Default: 0.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.max_limit = max_limit
+        self.total_items = total_items
+        self.body_size = body_size
+        self.throttle_rate = throttle_rate
+        self.spaces = spaces
+        self.host = host
+        self.port = port
+        self.requests_served = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def uri_base(self):
+        """
+        The base URI to point a ConfluenceAPI object at.
+        """
+        return "http://{}:{}/".format(self.host, self.port)
+
+    def start(self):
+        """
+        Start serving in a background thread.
+        :return: self
+        """
+        self._server = _ThreadingServer((self.host, self.port), self._make_handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-confluence")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving.
+        :return: None
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _delay(self):
+        with self._lock:
+            self.requests_served += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            throttled = self.throttle_rate and self._random.random() < self.throttle_rate
+        return delay, throttled
+
+    def _item(self, content_id, expand):
+        item = {"id": str(content_id), "type": "page", "status": "current", "title": "Page {}".format(content_id),
+                "space": {"key": "SP{}".format(content_id % self.spaces)},
+                "_links": {"webui": "/pages/viewpage.action?pageId={}".format(content_id)},
+                "_expandable": {"body": "", "ancestors": "", "children": ""}}
+        if "version" in expand:
+            item["version"] = {"number": 1 + content_id % 7, "when": "2016-01-01T00:00:00.000Z"}
+        if "body" in expand:
+            item["body"] = {"storage": {"value": "x" * self.body_size, "representation": "storage"}}
+            del item["_expandable"]["body"]
+        return item
+
+    def _page(self, path, params):
+        start = int(params.get("start", 0))
+        limit = min(int(params.get("limit", 25)), self.max_limit)
+        expand = params.get("expand", "")
+        if path == "/rest/api/space":
+            total = self.spaces
+            results = [{"key": "SP{}".format(i), "name": "Space {}".format(i), "type": "global"}
+                       for i in range(start, min(start + limit, total))]
+        else:
+            total = self.total_items
+            results = [self._item(i, expand) for i in range(start, min(start + limit, total))]
+        page = {"results": results, "start": start, "limit": limit, "size": len(results),
+                "_links": {"base": self.uri_base.rstrip("/")}}
+        if start + len(results) < total:
+            page["_links"]["next"] = "{}?start={}&limit={}".format(path, start + len(results), limit)
+        return page
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload=None, headers=()):
+                body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                delay, throttled = server._delay()
+                if delay:
+                    time.sleep(delay)
+                if throttled:
+                    return self._reply(429, {"statusCode": 429, "message": "Rate limited"}, [("Retry-After", "1")])
+                url = urlparse(self.path)
+                params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+                path = "/" + url.path.lstrip("/")
+                match = server.ITEM_RE.match(path)
+                if self.command == "DELETE":
+                    return self._reply(204)
+                if match:
+                    return self._reply(200, server._item(int(match.group(1)), params.get("expand", "")))
+                return self._reply(200, server._page(path, params))
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a fake Confluence REST server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--max-limit", type=int, default=100)
+    parser.add_argument("--total-items", type=int, default=1000)
+    parser.add_argument("--body-size", type=int, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeConfluenceServer(args.latency, args.jitter, args.max_limit, args.total_items, args.body_size,
+                                args.throttle_rate, port=args.port).start()
+    print("Serving on {}".format(fake.uri_base))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
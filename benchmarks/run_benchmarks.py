@@ -0,0 +1,184 @@
+"""
+Benchmark PythonConfluenceAPI against the fake Confluence server.
+
+Measures throughput, latency percentiles, CPU time and peak Python memory for the synchronous ConfluenceAPI, the
+ConfluenceFuturesAPI at several worker counts, and all_of over a large result set. Results are written as JSON so
+they can be compared between releases:
+
+    python benchmarks/run_benchmarks.py --latency 0.02 --output results.json
+
+By default the fake server runs in a child process, so CPU and memory figures only cover the client. Memory is
+measured with tracemalloc, whose overhead is included in the CPU figures; latencies of futures scenarios are measured
+from submission, so they include time spent queued for a worker.
+"""
+__author__ = 'Robert Cope'
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import PythonConfluenceAPI  # noqa: E402
+from PythonConfluenceAPI import ConfluenceAPI, ConfluenceFuturesAPI, RequestMetrics, all_of  # noqa: E402
+from fake_confluence import FakeConfluenceServer  # noqa: E402
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Measurement(object):
+    def __init__(self, name, **parameters):
+        self.name = name
+        self.parameters = parameters
+        self.latencies = []
+        self.errors = 0
+        self.items = 0
+
+    def __enter__(self):
+        tracemalloc.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def result(self):
+        latencies = sorted(self.latencies)
+        operations = len(latencies) + self.errors
+        return {"name": self.name, "parameters": self.parameters, "operations": operations, "errors": self.errors,
+                "items": self.items, "wall_seconds": self.wall, "cpu_seconds": self.cpu,
+                "throughput_per_second": (operations / self.wall) if self.wall else None,
+                "items_per_second": (self.items / self.wall) if self.wall and self.items else None,
+                "latency_seconds": {"p50": _percentile(latencies, 0.5), "p90": _percentile(latencies, 0.9),
+                                    "p99": _percentile(latencies, 0.99), "max": latencies[-1] if latencies else None},
+                "peak_memory_bytes": self.peak_memory}
+
+
+def bench_sync(uri_base, requests_count):
+    api = ConfluenceAPI("bench", "bench", uri_base)
+    with Measurement("sync_get_content_by_id", requests=requests_count) as m:
+        for i in range(requests_count):
+            start = time.perf_counter()
+            try:
+                api.get_content_by_id(i, expand="version")
+                m.latencies.append(time.perf_counter() - start)
+            except Exception:
+                m.errors += 1
+    return m.result()
+
+
+def bench_futures(uri_base, requests_count, max_workers):
+    api = ConfluenceFuturesAPI("bench", "bench", uri_base, max_workers=max_workers)
+    with Measurement("futures_get_content_by_id", requests=requests_count, max_workers=max_workers) as m:
+        started = {}
+
+        def done(future):
+            if future.exception() is None:
+                m.latencies.append(time.perf_counter() - started[future])
+        futures = []
+        for i in range(requests_count):
+            start = time.perf_counter()
+            future = api.get_content_by_id(i, expand="version")
+            started[future] = start
+            future.add_done_callback(done)
+            futures.append(future)
+        for future in futures:
+            if future.exception() is not None:
+                m.errors += 1
+    api.session.executor.shutdown()
+    return m.result()
+
+
+def bench_all_of(uri_base, total_items, expand):
+    with Measurement("all_of_get_content", total_items=total_items, expand=expand) as m:
+        def record(sample):
+            # Requests that died before an answer have no latency; the error surfaces from all_of below.
+            if sample["latency"] is not None:
+                m.latencies.append(sample["latency"])
+        metrics = RequestMetrics(callback=record)
+        api = ConfluenceAPI("bench", "bench", uri_base, metrics=metrics)
+        try:
+            # The initial limit asks for everything; the server clamps it to its page size limit.
+            for _ in all_of(api.get_content, expand=expand or None, limit=total_items):
+                m.items += 1
+        except Exception:
+            m.errors += 1
+    return m.result()
+
+
+def _serve(config, port_queue):
+    server = FakeConfluenceServer(**config).start()
+    port_queue.put(server.port)
+    while True:
+        time.sleep(3600)
+
+
+def run(args):
+    config = {"latency": args.latency, "jitter": args.jitter, "max_limit": args.max_limit,
+              "total_items": args.total_items, "body_size": args.body_size, "throttle_rate": args.throttle_rate}
+    process = server = None
+    if args.in_thread:
+        server = FakeConfluenceServer(**config).start()
+        uri_base = server.uri_base
+    else:
+        port_queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_serve, args=(config, port_queue))
+        process.daemon = True
+        process.start()
+        uri_base = "http://127.0.0.1:{}/".format(port_queue.get(timeout=30))
+    try:
+        results = [bench_sync(uri_base, args.requests)]
+        for workers in args.workers:
+            results.append(bench_futures(uri_base, args.requests, workers))
+        results.append(bench_all_of(uri_base, args.total_items, ""))
+        results.append(bench_all_of(uri_base, args.total_items, "body.storage"))
+    finally:
+        if server is not None:
+            server.stop()
+        if process is not None:
+            process.terminate()
+    return {"library_version": PythonConfluenceAPI.__version__,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "server": dict(config, in_thread=args.in_thread), "timestamp": time.time(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PythonConfluenceAPI against a fake Confluence server.")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per single-item scenario.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16, 32],
+                        help="max_workers values for the futures scenarios.")
+    parser.add_argument("--latency", type=float, default=0.01, help="Base server latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform extra server latency in seconds.")
+    parser.add_argument("--max-limit", type=int, default=100, help="Server side page size limit.")
+    parser.add_argument("--total-items", type=int, default=5000, help="Items in each collection.")
+    parser.add_argument("--body-size", type=int, default=2048, help="Storage body size in bytes.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--in-thread", action="store_true",
+                        help="Run the server in a thread of the benchmark process instead of a child process.")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    args = parser.parse_args()
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
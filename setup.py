@@ -1,10 +1,16 @@
 __author__ = 'Robert Cope, Pushrod Technology'
 __author_email__ = 'robert.cope@pushrodtechnology.com'
-__version__ = '0.0.1rc6'
+
+import os
+import re
 
 import ez_setup
 ez_setup.use_setuptools()
 
+# The version is kept in the package (PythonConfluenceAPI.__version__); read it without importing the package.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PythonConfluenceAPI', '__init__.py')) as f:
+    __version__ = re.search(r"^__version__ = '([^']+)'", f.read(), re.MULTILINE).group(1)
+
 from setuptools import setup
 
 setup(name='PythonConfluenceAPI',
@@ -20,11 +26,20 @@ setup(name='PythonConfluenceAPI',
       license="LGPLv3",
       keywords="atlassian confluence api",
       url="https://github.com/pushrodtechnology/PythonConfluenceAPI",
-      install_requires=['requests>=2.3.0', 'anyjson', 'futures', 'requests-futures'],
+      install_requires=['requests>=2.3.0', 'anyjson', 'requests-futures'],
+      python_requires='>=3.8',
+      extras_require={'columnar': ['pyarrow']},
       classifiers=["Development Status :: 2 - Pre-Alpha",
                    "Environment :: Other Environment",
                    "License :: OSI Approved :: GNU Lesser General Public License v2 or later (LGPLv2+)",
                    "Operating System :: OS Independent",
+                   "Programming Language :: Python :: 3",
+                   "Programming Language :: Python :: 3 :: Only",
+                   "Programming Language :: Python :: 3.8",
+                   "Programming Language :: Python :: 3.9",
+                   "Programming Language :: Python :: 3.10",
+                   "Programming Language :: Python :: 3.11",
+                   "Programming Language :: Python :: 3.12",
                    "Intended Audience :: Developers",
                    "Intended Audience :: System Administrators",
                    "Topic :: Internet :: WWW/HTTP",
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import time
+import unittest
+
+from PythonConfluenceAPI.breaker import CLOSED, HALF_OPEN, CircuitBreaker, CircuitOpenError
+
+
+class _Request(object):
+    def __init__(self):
+        self.uri = "https://wiki.example.com/rest/api/content"
+        self.context = {}
+
+
+class _Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(min_requests=2, reset_timeout=0.05, half_open_probes=1)
+
+    def send(self, status_code):
+        request = _Request()
+        self.breaker.before_request(request)
+        self.breaker.after_response(request, _Response(status_code))
+
+    def trip(self):
+        self.send(500)
+        self.send(500)
+        self.assertRaises(CircuitOpenError, self.breaker.before_request, _Request())
+        time.sleep(0.06)
+
+    def test_probe_closes_breaker(self):
+        self.trip()
+        self.send(200)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens_breaker(self):
+        self.trip()
+        self.send(503)
+        self.assertRaises(CircuitOpenError, self.breaker.before_request, _Request())
+
+    def test_hung_probe_is_written_off(self):
+        self.trip()
+        hung = _Request()
+        self.breaker.before_request(hung)
+        self.assertRaises(CircuitOpenError, self.breaker.before_request, _Request())
+        time.sleep(0.06)
+        self.send(200)
+        self.assertEqual(self.breaker.state, CLOSED)
+        # A late report from the written-off probe is ignored.
+        self.breaker.after_response(hung, _Response(500))
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_stale_probe_does_not_count(self):
+        self.trip()
+        hung = _Request()
+        self.breaker.before_request(hung)
+        time.sleep(0.06)
+        probe = _Request()
+        self.breaker.before_request(probe)
+        self.breaker.after_response(hung, _Response(200))
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.after_response(probe, _Response(200))
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import unittest
+
+import requests
+
+from PythonConfluenceAPI.bulk import DeleteSkippedError, bulk_delete, delete_subtree
+from PythonConfluenceAPI.metrics import RequestMetrics
+
+
+def _http_error(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+class FakeAPI(object):
+    def __init__(self, failures=None, tree=None):
+        self.metrics = RequestMetrics()
+        self.failures = dict(failures or {})
+        self.tree = tree or []
+        self.deleted = []
+
+    def delete_content_by_id(self, content_id, status=None):
+        errors = self.failures.get(content_id)
+        if errors:
+            raise errors.pop(0)
+        self.deleted.append(content_id)
+
+    def get_content_descendants_by_type(self, content_id, child_type, expand=None, start=None, limit=None):
+        return {"results": self.tree, "start": 0, "size": len(self.tree), "limit": 25, "_links": {}}
+
+
+class BulkDeleteTest(unittest.TestCase):
+    def test_throttled_deletes_are_retried_and_recorded(self):
+        api = FakeAPI({"1": [_http_error(429, {"Retry-After": "0"}), _http_error(503, {"Retry-After": "0"})]})
+        results = bulk_delete(api, ["1", "2"])
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(results[0].attempts, 3)
+        self.assertEqual(api.metrics.snapshot()["retries"], {"rest/api/content/{id}": 2})
+
+    def test_other_errors_are_not_retried(self):
+        api = FakeAPI({"1": [_http_error(403)]})
+        result, = bulk_delete(api, ["1"])
+        self.assertIsInstance(result.error, requests.HTTPError)
+        self.assertEqual(result.attempts, 1)
+
+    def test_subtree_skips_ancestors_of_failures(self):
+        tree = [{"id": "2", "ancestors": [{"id": "1"}]},
+                {"id": "3", "ancestors": [{"id": "1"}, {"id": "2"}]},
+                {"id": "4", "ancestors": [{"id": "1"}]}]
+        api = FakeAPI({"3": [_http_error(403)]}, tree)
+        results = dict((result.content_id, result) for result in delete_subtree(api, "1"))
+        self.assertEqual(sorted(api.deleted), ["4"])
+        self.assertIsInstance(results["3"].error, requests.HTTPError)
+        for page_id in ("1", "2"):
+            self.assertIsInstance(results[page_id].error, DeleteSkippedError)
+            self.assertFalse(results[page_id].ok)
+
+
+if __name__ == '__main__':
+    unittest.main()
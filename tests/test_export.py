@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import io
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from PythonConfluenceAPI.export import export_arrow_ipc, export_ndjson, export_parquet
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ITEMS = [{"id": str(n), "title": "Page {}".format(n) if n > 3 else None, "extra": {"n": n} if n > 3 else None}
+         for n in range(1, 8)]
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ndjson_path_like(self):
+        path = pathlib.Path(self.directory) / "out.ndjson"
+        self.assertEqual(export_ndjson(ITEMS, path, fields=["id", "title"]), len(ITEMS))
+        with io.open(str(path), encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["id"] for line in f], [item["id"] for item in ITEMS])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_leading_nulls(self):
+        path = os.path.join(self.directory, "out.parquet")
+        export_parquet(ITEMS, path, fields=["id", "title", "extra.n"], row_group_size=3)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column("title").to_pylist(), [item["title"] for item in ITEMS])
+        self.assertEqual(table.column("extra.n").to_pylist(), [None] * 3 + ["4", "5", "6", "7"])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_unknown_columns_change_type(self):
+        path = os.path.join(self.directory, "out.parquet")
+        items = [{"id": "1", "extra": 1}, {"id": "2", "extra": {"a": 1}}, {"id": "3", "extra": "abc"},
+                 {"id": "4", "extra": {"a": 1, "b": 2}}]
+        export_parquet(items, path, fields=["id", "extra"], row_group_size=1)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column("extra").to_pylist(), ["1", '{"a":1}', "abc", '{"a":1,"b":2}'])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_ipc_leading_nulls(self):
+        path = os.path.join(self.directory, "out.arrow")
+        export_arrow_ipc(ITEMS, path, fields=["id", "title"], batch_size=3)
+        table = pyarrow.ipc.open_file(path).read_all()
+        self.assertEqual(table.column("title").to_pylist(), [item["title"] for item in ITEMS])
+
+
+if __name__ == '__main__':
+    unittest.main()
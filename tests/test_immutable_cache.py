@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import json
+import unittest
+
+from PythonConfluenceAPI import ConfluenceAPI
+from PythonConfluenceAPI.auth import SessionCookieAuth
+from PythonConfluenceAPI.cache import MemoryCache
+
+
+class _Response(object):
+    def __init__(self, data):
+        self.text = json.dumps(data)
+
+
+class RecordingAPI(ConfluenceAPI):
+    def __init__(self, *args, **kwargs):
+        super(RecordingAPI, self).__init__(*args, **kwargs)
+        self.requests = []
+
+    def _service_get_request(self, sub_uri, params=None, callback=None):
+        self.requests.append((sub_uri, params))
+        data = {"id": "1", "user": self.username}
+        return callback(_Response(data)) if callback else data
+
+
+class ImmutableCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCache()
+
+    def api(self, username="alice", **kwargs):
+        return RecordingAPI(username, "secret", "https://wiki.example.com", immutable_cache=self.cache, **kwargs)
+
+    def test_pinned_immutable_expansions_are_cached(self):
+        api = self.api()
+        for _ in range(2):
+            api.get_content_by_id("1", version=3, expand="body.storage,body.view,version")
+        self.assertEqual(len(api.requests), 1)
+
+    def test_mutable_expansions_are_not_cached(self):
+        api = self.api()
+        for expand in (None, "body.storage,children.page", "body.storage,space", "ancestors", "history.lastUpdated",
+                       "metadata.labels", "restrictions.read.restrictions.user", "container", "descendants.comment"):
+            for _ in range(2):
+                api.get_content_by_id("1", version=3, expand=expand)
+        self.assertEqual(len(api.requests), 18)
+
+    def test_cache_is_per_principal(self):
+        alice, bob = self.api("alice"), self.api("bob")
+        self.assertEqual(alice.get_content_by_id("1", version=3, expand="version")["user"], "alice")
+        self.assertEqual(bob.get_content_by_id("1", version=3, expand="version")["user"], "bob")
+        self.assertEqual(len(bob.requests), 1)
+
+    def test_auth_object_identity(self):
+        api = self.api(None, auth=SessionCookieAuth("carol", "secret"))
+        for _ in range(2):
+            api.get_content_by_id("1", version=3, expand="version")
+        self.assertEqual(len(api.requests), 1)
+        self.assertTrue(all(key.startswith("carol@") for key in self.cache._entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
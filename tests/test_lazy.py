@@ -0,0 +1,84 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import unittest
+
+from PythonConfluenceAPI.lazy import LazyContent, lazy_content
+
+# The expandable properties of the fake content, with their own expandable properties.
+EXPANDABLE = {"body": {"storage": {}, "view": {}}, "version": {}, "ancestors": {}}
+
+
+def _page(content_id):
+    return {"id": content_id, "type": "page", "title": "Page {}".format(content_id),
+            "body": {"storage": {"value": "<p>{}</p>".format(content_id), "representation": "storage"},
+                     "view": {"value": content_id, "representation": "view"}},
+            "version": {"number": 3}, "ancestors": [{"id": "0", "title": "Home", "_expandable": {}}]}
+
+
+def _render(full, expandable, expand):
+    expanded = dict((path[0], path[1:]) for path in expand if path)
+    data = dict((k, v) for k, v in full.items() if k not in expandable)
+    data["_expandable"] = dict((k, "") for k in expandable if k not in expanded)
+    for name, rest in expanded.items():
+        if expandable.get(name):
+            data[name] = _render(full[name], expandable[name], [rest] if rest else [])
+        elif name in full:
+            data[name] = full[name]
+    return data
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.requests = []
+
+    @staticmethod
+    def _get(content_id, expand):
+        return _render(_page(content_id), EXPANDABLE, [tuple(e.split(".")) for e in (expand or "").split(",")])
+
+    def get_content_by_id(self, content_id, expand=None):
+        self.requests.append(expand)
+        return self._get(content_id, expand)
+
+    def search_content(self, cql_str, expand=None, limit=None):
+        self.requests.append(expand)
+        ids = cql_str[len("id in ("):-1].split(",")
+        return {"results": [self._get(content_id, expand) for content_id in ids]}
+
+
+class LazyContentTest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+
+    def test_nested_field_costs_one_request(self):
+        page = LazyContent(_render(_page("1"), EXPANDABLE, []), self.api)
+        self.assertEqual(page.body.storage.value, "<p>1</p>")
+        self.assertEqual(self.api.requests, ["body.storage"])
+        self.assertEqual(page.body.view.value, "1")
+        self.assertEqual(self.api.requests, ["body.storage", "body.view"])
+
+    def test_leaf_expansions(self):
+        page = LazyContent(_render(_page("1"), EXPANDABLE, []), self.api)
+        self.assertEqual(page.version.number, 3)
+        self.assertEqual([ancestor.title for ancestor in page.ancestors], ["Home"])
+        self.assertEqual(self.api.requests, ["version", "ancestors"])
+
+    def test_container_membership_and_dict(self):
+        page = LazyContent(_render(_page("1"), EXPANDABLE, []), self.api)
+        self.assertIn("storage", page.body)
+        self.assertIn("storage", page.body.to_dict()["_expandable"])
+        self.assertEqual(self.api.requests, ["body"])
+
+    def test_batch_fetches_full_path(self):
+        pages = lazy_content({"results": [_render(_page(str(n)), EXPANDABLE, []) for n in range(1, 4)]}, self.api)
+        self.assertEqual([page.body.storage.value for page in pages], ["<p>1</p>", "<p>2</p>", "<p>3</p>"])
+        self.assertEqual(self.api.requests, ["body.storage"])
+
+    def test_missing_field(self):
+        page = LazyContent(_render(_page("1"), EXPANDABLE, []), self.api)
+        self.assertRaises(AttributeError, getattr, page, "children")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import copy
+import pickle
+import unittest
+
+from PythonConfluenceAPI.models import Content, ModelFactory, Space
+
+PAGE = {"id": "1", "type": "page", "title": "Home", "status": "current", "space": {"key": "TST", "id": 7},
+        "version": {"number": 2, "by": {"username": "alice"}},
+        "metadata": {"labels": {"results": [{"name": "docs", "prefix": "global", "id": "3"}]}},
+        "ancestors": [{"id": "0"}]}
+
+
+class ModelTest(unittest.TestCase):
+    def test_equal_models_hash_equal(self):
+        first, second = Content.from_json(PAGE), Content.from_json(dict(PAGE))
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertEqual(len({first, second}), 1)
+
+    def test_different_models_differ(self):
+        self.assertNotEqual(Content.from_json(PAGE), Content.from_json(dict(PAGE, title="Other")))
+        self.assertNotEqual(Space("TST"), Space("TST", 7))
+
+    def test_models_are_immutable(self):
+        page = Content.from_json(PAGE)
+        self.assertRaises(AttributeError, setattr, page, "title", "Other")
+        self.assertRaises(AttributeError, delattr, page, "title")
+        self.assertEqual(page.title, "Home")
+
+    def test_models_copy_and_pickle(self):
+        page = Content.from_json(PAGE)
+        self.assertEqual(copy.copy(page), page)
+        self.assertEqual(pickle.loads(pickle.dumps(page)), page)
+
+    def test_spaces_are_shared(self):
+        factory = ModelFactory()
+        self.assertIs(Content.from_json(PAGE, factory).space, Content.from_json(PAGE, factory).space)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import re
+import unittest
+
+from PythonConfluenceAPI.parallel import DEFAULT_SHARD_TYPES, crawl_spaces, shard_queries, sharded_search
+
+SPACES = {"current": ["DEV", "TST"], "archived": ["OLD"]}
+CONTENT = [{"id": "1", "type": "page", "space": "DEV"}, {"id": "2", "type": "blogpost", "space": "TST"},
+           {"id": "3", "type": "page", "space": "OLD"}, {"id": "4", "type": "whiteboard", "space": "DEV"}]
+
+
+def _page(results):
+    return {"results": results, "start": 0, "size": len(results), "limit": 25, "_links": {}}
+
+
+class FakeAPI(object):
+    def get_spaces(self, space_key=None, expand=None, start=None, limit=None, status=None, callback=None):
+        return _page([{"key": key} for key in SPACES[status or "current"]])
+
+    def search_content(self, cql_str=None, expand=None, limit=None, start=None):
+        match = re.search(r'AND (\w+) (=|NOT IN) \(?([^)]*)\)?$', cql_str)
+        field, operator, values = match.group(1), match.group(2), re.findall(r'"([^"]*)"', match.group(3))
+        return _page([item for item in CONTENT if (item[field] in values) == (operator == "=")])
+
+    def get_space_content_by_type(self, space_key, content_type, depth=None, expand=None, limit=None, start=None):
+        return _page([item for item in CONTENT if item["space"] == space_key and item["type"] == content_type])
+
+
+class ParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+
+    def test_shard_queries_remainder(self):
+        queries = shard_queries("label = x", "type", ("page", "blogpost"), remainder=True)
+        self.assertEqual(queries, ['(label = x) AND type = "page"', '(label = x) AND type = "blogpost"',
+                                   '(label = x) AND type NOT IN ("page","blogpost")'])
+
+    def test_space_shards_include_archived_spaces(self):
+        self.assertEqual(sorted(item["id"] for item in sharded_search(self.api, "text ~ x", by="space")),
+                         ["1", "2", "3", "4"])
+
+    def test_type_shards_cover_other_types(self):
+        self.assertNotIn("whiteboard", DEFAULT_SHARD_TYPES)
+        self.assertEqual(sorted(item["id"] for item in sharded_search(self.api, "text ~ x", by="type")),
+                         ["1", "2", "3", "4"])
+
+    def test_deduplicates_date_shards_only(self):
+        self.api.search_content = lambda cql_str=None, **kwargs: _page([{"id": "1"}])
+        self.assertEqual(len(list(sharded_search(self.api, "text ~ x", by="created", shards=["2016-01-01"]))), 1)
+        self.assertEqual(len(list(sharded_search(self.api, "text ~ x", by="space", shards=["A", "B"]))), 2)
+        self.assertEqual(len(list(sharded_search(self.api, "text ~ x", by="space", shards=["A", "B"],
+                                                 deduplicate=True))), 1)
+
+    def test_crawl_includes_archived_spaces(self):
+        self.assertEqual(sorted((key, item["id"]) for key, item in crawl_spaces(self.api)),
+                         [("DEV", "1"), ("OLD", "3"), ("TST", "2")])
+
+
+if __name__ == '__main__':
+    unittest.main()
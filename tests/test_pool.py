@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+
+__author__ = 'Robert Cope'
+
+import threading
+import time
+import unittest
+
+from PythonConfluenceAPI.pool import FairExecutor
+
+
+class FairExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = FairExecutor(max_workers=8)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_burst_grows_pool_past_idle_worker(self):
+        # Leave one idle worker behind, then submit a burst it cannot serve alone.
+        self.pool.submit("a", lambda: None).result()
+        started = time.time()
+        futures = [self.pool.submit("a", time.sleep, 0.5) for _ in range(8)]
+        for future in futures:
+            future.result()
+        self.assertLess(time.time() - started, 1.5)
+        self.assertEqual(len(self.pool._threads), 8)
+
+    def test_tenants_take_turns(self):
+        pool = FairExecutor(max_workers=1)
+        order = []
+        started, gate = threading.Event(), threading.Event()
+        pool.submit("a", lambda: started.set() or gate.wait())
+        started.wait()
+        futures = [pool.submit("a", order.append, "a") for _ in range(3)]
+        futures.append(pool.submit("b", order.append, "b"))
+        gate.set()
+        for future in futures:
+            future.result()
+        pool.shutdown()
+        self.assertEqual(order, ["a", "b", "a", "a"])
+
+    def test_max_per_tenant(self):
+        pool = FairExecutor(max_workers=4, max_per_tenant=1)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def task():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        for future in [pool.submit("a", task) for _ in range(4)]:
+            future.result()
+        pool.shutdown()
+        self.assertEqual(running[1], 1)
+
+    def test_submit_after_shutdown(self):
+        self.pool.shutdown()
+        self.assertRaises(RuntimeError, self.pool.submit, "a", lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()